@@ -7,13 +7,116 @@ The actual FTP protocol implementation lives in simple_ftp.FTPConnection.
 This file only contains the Tkinter GUI and high-level user interactions.
 """
 
+import io
+import logging
 import os
+import posixpath
+import queue
+import re
+import ssl
 import threading
+import time
+import traceback
 import tkinter as tk
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
 from tkinter import ttk, messagebox, simpledialog, filedialog
-from typing import List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
-from simple_ftp import FTPConnection, FTPProtocolError
+from simple_ftp import FTPConnection, FTPConnectionPool, FTPProtocolError
+
+log = logging.getLogger(__name__)
+
+# Files at least this large are downloaded over several connections at once
+PARALLEL_MIN_SIZE = 8 << 20
+# Number of parallel REST+RETR ranges for a large download
+PARALLEL_PARTS = 4
+# Worker threads for transfers over pooled connections
+MAX_WORKERS = 8
+
+# Rows inserted into the file list per idle callback
+TREE_BATCH = 500
+# Seconds a cached directory listing is reused instead of sending LIST again
+LIST_CACHE_TTL = 2.0
+# Same for a parent listing prefetched in the background: it is meant for a
+# later "Up", which usually comes well after LIST_CACHE_TTL
+PREFETCH_CACHE_TTL = 30.0
+# Milliseconds between status bar redraws; later texts replace pending ones
+STATUS_INTERVAL = 33
+# Bytes between download progress reports
+PROGRESS_STEP = 1 << 20
+
+# One file list row: (name, size text, "dir" or "file")
+Row = Tuple[str, str, str]
+
+# UNIX-style LIST line: perms links owner group size month day time/year name
+# Groups: 1 = first perms char ("d" for directories), 2 = size, 3 = name
+_LIST_RE = re.compile(r"^(\S)\S*(?:\s+\S+){3}\s+(\d+)(?:\s+\S+){3}\s+(.+)$")
+
+
+class Listing:
+    """A directory listing stored as parallel arrays.
+
+    Entry i is names[i], is_dir[i] (1 or 0) and sizes[i] (bytes, -1 if
+    unknown or a directory). The flags and sizes live in flat C arrays
+    instead of one tuple plus boxed values per entry, so large listings
+    allocate far fewer objects. Display rows are built only when inserted.
+    """
+
+    __slots__ = ("names", "is_dir", "sizes")
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self.is_dir = bytearray()
+        self.sizes = array("q")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str, is_dir: bool, size: int = -1) -> None:
+        self.names.append(name)
+        self.is_dir.append(is_dir)
+        self.sizes.append(size)
+
+    def row(self, i: int) -> Row:
+        size = self.sizes[i]
+        if self.is_dir[i]:
+            return (self.names[i], "", "dir")
+        return (self.names[i], "" if size < 0 else str(size), "file")
+
+    def index(self, name: str) -> int:
+        """Return the position of name, or -1 if absent."""
+        try:
+            return self.names.index(name)
+        except ValueError:
+            return -1
+
+    def take(self, order: List[int]) -> "Listing":
+        """Return a new listing with the entries at the given positions."""
+        names, is_dir, sizes = self.names, self.is_dir, self.sizes
+        out = Listing()
+        out.names = [names[i] for i in order]
+        out.is_dir = bytearray(is_dir[i] for i in order)
+        out.sizes = array("q", [sizes[i] for i in order])
+        return out
+
+    def without(self, names: Set[str]) -> "Listing":
+        """Return a copy without the entries called one of names."""
+        return self.take([i for i, name in enumerate(self.names) if name not in names])
+
+    def sorted(self) -> "Listing":
+        """Return a copy with directories first, each group sorted caselessly.
+
+        Only a permutation of positions is sorted, keyed by a precomputed
+        list of casefolded names; no per-entry tuples are compared.
+        """
+        keys = [name.casefold() for name in self.names]
+        is_dir = self.is_dir
+        dirs = [i for i in range(len(keys)) if is_dir[i]]
+        files = [i for i in range(len(keys)) if not is_dir[i]]
+        dirs.sort(key=keys.__getitem__)
+        files.sort(key=keys.__getitem__)
+        return self.take(dirs + files)
 
 
 class FTPClientGUI:
@@ -22,11 +125,42 @@ class FTPClientGUI:
         self.master.title("Simple FTP Client (Raw Socket)")
         self.master.geometry("900x500")
 
+        # Control connection; only ever used by the "ftp-control" worker thread
         self.ftp: Optional[FTPConnection] = None
         self.current_path = "/"
+        # Extra logged-in connections for transfers (uploads, downloads, ranges)
+        self._pool: Optional[FTPConnectionPool] = None
+        # Bounded, reused worker threads for transfers over pooled connections
+        self._exec = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="ftp")
+        # Jobs for the control connection, run in order by one worker thread
+        self._cmd_q: "queue.Queue[Optional[Callable[[], None]]]" = queue.Queue()
+        # Control jobs queued whose outcome the Tk thread has not seen yet
+        self._jobs_pending = 0
+        # Background cache warm-ups, run by their own worker on their own
+        # connection so they never delay user actions (see _prefetch_parent)
+        self._prefetch_q: "queue.Queue[Optional[Callable[[], None]]]" = queue.Queue()
+        self._prefetch_pool: Optional[FTPConnectionPool] = None
+        # Paths with a LIST job already queued, so repeated refreshes coalesce
+        self._queued_lists: Set[str] = set()
+        # Reused upload buffer for "New File" content (worker thread only)
+        self._scratch = io.BytesIO()
+        # Error messages waiting for the next (single) error dialog
+        self._pending_errors: List[str] = []
+        # Latest status text not yet shown, and whether a redraw is scheduled
+        self._pending_status = ""
+        self._status_scheduled = False
+        # Bumped whenever the file list is cleared, to cancel pending row batches
+        self._fill_gen = 0
+        # Remote path -> (time.monotonic() of the LIST, expiry, sorted listing)
+        self._list_cache: Dict[str, Tuple[float, float, Listing]] = {}
 
         self._build_widgets()
         self._set_disconnected_state()
+        self.master.protocol("WM_DELETE_WINDOW", self._on_close)
+        threading.Thread(target=self._job_worker, args=(self._cmd_q,),
+                         name="ftp-control", daemon=True).start()
+        threading.Thread(target=self._job_worker, args=(self._prefetch_q,),
+                         name="ftp-prefetch", daemon=True).start()
 
     # ---------------- UI -----------------
     def _build_widgets(self) -> None:
@@ -36,7 +170,7 @@ class FTPClientGUI:
         # Connection frame
         frm_conn = ttk.LabelFrame(self.master, text="Connection")
         frm_conn.grid(row=0, column=0, sticky="ew", padx=8, pady=4)
-        for i in range(10):
+        for i in range(11):
             frm_conn.columnconfigure(i, weight=1)
 
         ttk.Label(frm_conn, text="Host:").grid(row=0, column=0, padx=4, pady=2, sticky="e")
@@ -58,10 +192,15 @@ class FTPClientGUI:
         self.ent_pass = ttk.Entry(frm_conn, show="*")
         self.ent_pass.grid(row=0, column=7, padx=4, pady=2, sticky="ew")
 
+        # Explicit FTPS (AUTH TLS + PROT P)
+        self.use_tls = tk.BooleanVar(value=False)
+        self.chk_tls = ttk.Checkbutton(frm_conn, text="TLS", variable=self.use_tls)
+        self.chk_tls.grid(row=0, column=8, padx=4, pady=2)
+
         self.btn_connect = ttk.Button(frm_conn, text="Connect", command=self.connect)
-        self.btn_connect.grid(row=0, column=8, padx=4, pady=2)
+        self.btn_connect.grid(row=0, column=9, padx=4, pady=2)
         self.btn_disconnect = ttk.Button(frm_conn, text="Disconnect", command=self.disconnect)
-        self.btn_disconnect.grid(row=0, column=9, padx=4, pady=2)
+        self.btn_disconnect.grid(row=0, column=10, padx=4, pady=2)
 
         # Path + operations
         frm_path = ttk.Frame(self.master)
@@ -74,19 +213,29 @@ class FTPClientGUI:
 
         self.btn_up = ttk.Button(frm_path, text="Up", width=5, command=self.go_up)
         self.btn_up.grid(row=0, column=2, padx=2)
+        self.btn_refresh = ttk.Button(frm_path, text="Refresh",
+                                      command=lambda: self._refresh_list(force=True))
+        self.btn_refresh.grid(row=0, column=3, padx=2)
 
         self.btn_mkdir = ttk.Button(frm_path, text="New Folder", command=self.mkdir)
-        self.btn_mkdir.grid(row=0, column=3, padx=2)
+        self.btn_mkdir.grid(row=0, column=4, padx=2)
         self.btn_newfile = ttk.Button(frm_path, text="New File", command=self.new_file)
-        self.btn_newfile.grid(row=0, column=4, padx=2)
+        self.btn_newfile.grid(row=0, column=5, padx=2)
         self.btn_upload = ttk.Button(frm_path, text="Upload", command=self.upload)
-        self.btn_upload.grid(row=0, column=5, padx=2)
+        self.btn_upload.grid(row=0, column=6, padx=2)
         self.btn_rename = ttk.Button(frm_path, text="Rename", command=self.rename)
-        self.btn_rename.grid(row=0, column=6, padx=2)
+        self.btn_rename.grid(row=0, column=7, padx=2)
         self.btn_delete = ttk.Button(frm_path, text="Delete", command=self.delete)
-        self.btn_delete.grid(row=0, column=7, padx=2)
+        self.btn_delete.grid(row=0, column=8, padx=2)
         self.btn_download = ttk.Button(frm_path, text="Download", command=self.download)
-        self.btn_download.grid(row=0, column=8, padx=2)
+        self.btn_download.grid(row=0, column=9, padx=2)
+
+        # Buttons that are only usable while connected
+        self._session_btns = [
+            self.btn_disconnect, self.btn_up, self.btn_refresh, self.btn_mkdir,
+            self.btn_newfile, self.btn_upload, self.btn_rename, self.btn_delete,
+            self.btn_download,
+        ]
 
         # File list
         frm_list = ttk.Frame(self.master)
@@ -95,7 +244,7 @@ class FTPClientGUI:
         frm_list.columnconfigure(0, weight=1)
 
         columns = ("name", "size", "type")
-        self.tree = ttk.Treeview(frm_list, columns=columns, show="headings", selectmode="browse")
+        self.tree = ttk.Treeview(frm_list, columns=columns, show="headings", selectmode="extended")
         self.tree.heading("name", text="Name")
         self.tree.heading("size", text="Size (bytes)")
         self.tree.heading("type", text="Type")
@@ -124,6 +273,8 @@ class FTPClientGUI:
         port_text = self.ent_port.get().strip() or "21"
         user = self.ent_user.get().strip() or "anonymous"
         password = self.ent_pass.get()
+        # One context per session: data connections resume its TLS session
+        context = ssl.create_default_context() if self.use_tls.get() else None
 
         try:
             port = int(port_text)
@@ -131,66 +282,270 @@ class FTPClientGUI:
             messagebox.showerror("Error", "Invalid port number")
             return
 
-        def _do_connect():
-            self._set_status(f"Connecting to {host}:{port} ...")
+        def _do_connect() -> None:
             try:
-                ftp = FTPConnection()
+                ftp = FTPConnection(context)
                 ftp.connect(host, port, timeout=10)
                 ftp.login(user=user, password=password)
-                self.ftp = ftp
-                self.current_path = ftp.pwd()
-                self._set_connected_state()
-                self._refresh_list()
-                self._set_status("Connected")
+                # Size data socket buffers for this link from a quick RTT probe
+                ftp.autotune_buffers()
+                path = ftp.pwd()
             except Exception as e:
-                self.ftp = None
-                self._set_disconnected_state()
-                self._set_status("Disconnected")
-                messagebox.showerror("Connection failed", str(e))
+                self.master.after(0, _on_failed, e)
+                return
+            self.master.after(0, _on_connected, ftp, path)
 
-        threading.Thread(target=_do_connect, daemon=True).start()
+        def _on_failed(e: Exception) -> None:
+            self.ftp = None
+            self._set_disconnected_state()
+            self._set_status("Disconnected")
+            self._report_error(f"Connection failed: {e}")
+
+        def _on_connected(ftp: FTPConnection, path: str) -> None:
+            self.ftp = ftp
+            self._pool = FTPConnectionPool(host, port, user, password,
+                                           size=PARALLEL_PARTS, context=context)
+            self._pool.data_bufsize = ftp.data_bufsize
+            self._prefetch_pool = FTPConnectionPool(host, port, user, password,
+                                                    size=1, context=context)
+            self._prefetch_pool.data_bufsize = ftp.data_bufsize
+            self.current_path = path
+            self._set_connected_state()
+            self._refresh_list()
+            self._set_status("Connected")
+
+        self._set_status(f"Connecting to {host}:{port} ...")
+        self.btn_connect.configure(state="disabled")
+        self._cmd_q.put(_do_connect)
+
+    def _on_close(self) -> None:
+        # disconnect() starts closing the pools, which aborts transfers on
+        # borrowed connections, so the executor's threads finish promptly
+        self.disconnect()
+        self._cmd_q.put(None)
+        self._prefetch_q.put(None)
+        self._exec.shutdown(wait=False, cancel_futures=True)
+        self.master.destroy()
 
     def disconnect(self) -> None:
-        if self.ftp is not None:
-            try:
-                self.ftp.quit()
-            except Exception:
-                pass
-            finally:
-                self.ftp = None
+        # Jobs still waiting were meant for this session; drop them
+        for jobs in (self._cmd_q, self._prefetch_q):
+            while True:
+                try:
+                    jobs.get_nowait()
+                except queue.Empty:
+                    break
+        self._queued_lists.clear()
+        self._jobs_pending = 0
+        ftp, self.ftp = self.ftp, None
+        if ftp is not None:
+            # QUIT runs on the worker, after any job it is in the middle of
+            self._cmd_q.put(ftp.quit)
+        for pool in (self._pool, self._prefetch_pool):
+            if pool is not None:
+                # close() sends QUIT on every idle connection, which can take
+                # the socket timeout each on a dead server. A thread of its
+                # own starts at once even when _exec is busy with the very
+                # transfers it aborts, and is not cancelled by _on_close.
+                threading.Thread(target=pool.close, name="ftp-pool-close",
+                                 daemon=True).start()
+        self._pool = self._prefetch_pool = None
+        self._list_cache.clear()
         self._set_disconnected_state()
         self._set_status("Disconnected")
 
     # ------------- Helpers -------------
+    @staticmethod
+    def _job_worker(jobs: "queue.Queue[Optional[Callable[[], None]]]") -> None:
+        """Run jobs from a queue one at a time, until a None job.
+
+        The "ftp-control" worker runs _cmd_q: it is the only thread that
+        talks on self.ftp, so commands and their replies never interleave
+        and the Tk thread never blocks on the network. The "ftp-prefetch"
+        worker runs _prefetch_q the same way on its own connection.
+        """
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            try:
+                job()
+            except Exception:
+                # Jobs report their own errors to the UI; this is a safety net
+                traceback.print_exc()
+
+    def _run_ftp(self, work: Callable[[FTPConnection], Any],
+                 on_success: Callable[[Any], None], error_text: str,
+                 on_error: Optional[Callable[[], None]] = None) -> None:
+        """Queue work(ftp) for the control worker; see _finish() for the outcome."""
+        ftp = self.ftp
+        assert ftp is not None
+
+        def _done(result: Any, error: Optional[Exception]) -> None:
+            if self.ftp is ftp:
+                self._jobs_pending -= 1
+            self._finish(ftp, on_success, result, error, error_text, on_error)
+
+        def _job() -> None:
+            try:
+                result = work(ftp)
+            except Exception as e:
+                self.master.after(0, _done, None, e)
+                return
+            self.master.after(0, _done, result, None)
+
+        self._jobs_pending += 1
+        self._cmd_q.put(_job)
+
+    def _submit(self, work: Callable[[], Any], on_success: Callable[[Any], None],
+                error_text: str) -> Future:
+        """Run a blocking transfer on the shared worker pool.
+
+        Returns the Future of work(); its outcome goes through _finish() like
+        control-connection jobs do.
+        """
+        ftp = self.ftp
+
+        def _done(future: Future) -> None:
+            if future.cancelled():  # executor shut down on window close
+                return
+            error = future.exception()
+            result = None if error is not None else future.result()
+            self.master.after(0, self._finish, ftp, on_success, result, error, error_text)
+
+        future = self._exec.submit(work)
+        future.add_done_callback(_done)
+        return future
+
+    def _finish(self, ftp: Optional[FTPConnection], on_success: Callable[[Any], None],
+                result: Any, error: Optional[BaseException], error_text: str,
+                on_error: Optional[Callable[[], None]] = None) -> None:
+        """Deliver the outcome of an FTP job on the Tk thread.
+
+        Outcomes from a session that has since been disconnected are
+        dropped. Otherwise on_success(result) is called, or the error is
+        logged, put in the status bar and reported with _report_error(),
+        after which on_error() (if given) can undo optimistic UI changes.
+        If the error left the control connection closed, the session is
+        disconnected rather than kept around unusable.
+        """
+        if self.ftp is not ftp:
+            return
+        if error is None:
+            on_success(result)
+            return
+        self._set_status(error_text)
+        self._report_error(f"{error_text}: {error}")
+        if on_error is not None:
+            on_error()
+        if ftp is not None and not ftp.is_open:
+            self.disconnect()
+
+    def _report_error(self, message: str) -> None:
+        """Log message and show it in an error dialog soon after.
+
+        Errors that arrive before the dialog opens are joined into it, so a
+        burst of failures opens one dialog instead of a stack of them.
+        """
+        log.error("%s", message)
+        self._pending_errors.append(message)
+        if len(self._pending_errors) == 1:
+            self.master.after_idle(self._flush_errors)
+
+    def _flush_errors(self) -> None:
+        messages, self._pending_errors = self._pending_errors, []
+        messagebox.showerror("Error", "\n".join(messages))
+
     def _set_status(self, text: str) -> None:
-        self.status_var.set(text)
+        """Show text in the status bar within STATUS_INTERVAL ms.
+
+        Updates are coalesced: the bar is redrawn at most ~30 times a second
+        and shows the latest text, so frequent callers (download progress,
+        possibly from worker threads) cost one assignment each.
+        """
+        self._pending_status = text
+        if not self._status_scheduled:
+            self._status_scheduled = True
+            self.master.after(STATUS_INTERVAL, self._flush_status)
+
+    def _flush_status(self) -> None:
+        self._status_scheduled = False
+        self.status_var.set(self._pending_status)
+
+    def _download_progress(self, name: str, total: Optional[int]) -> Callable[[int], None]:
+        """Return a progress(n) callback that reports a download in the status bar.
+
+        It may be called from several threads at once (parallel ranges) and
+        reports bytes done, percentage and throughput every PROGRESS_STEP bytes.
+        """
+        lock = threading.Lock()
+        counts = [0, 0]  # bytes done, bytes done at the last report
+        started = time.monotonic()
+
+        def progress(n: int) -> None:
+            with lock:
+                counts[0] += n
+                done = counts[0]
+                if done - counts[1] < PROGRESS_STEP:
+                    return
+                counts[1] = done
+            rate = done / max(time.monotonic() - started, 1e-6) / (1 << 20)
+            percent = f" ({done * 100 // total}%)" if total else ""
+            self._set_status(f"Downloading {name}: {done >> 20} MiB{percent}, {rate:.1f} MiB/s")
+
+        return progress
+
+    def _set_session_btns(self, state: str) -> None:
+        for btn in self._session_btns:
+            btn.configure(state=state)
 
     def _set_connected_state(self) -> None:
         self.btn_connect.configure(state="disabled")
-        self.btn_disconnect.configure(state="normal")
-        self.btn_up.configure(state="normal")
-        self.btn_mkdir.configure(state="normal")
-        self.btn_newfile.configure(state="normal")
-        self.btn_upload.configure(state="normal")
-        self.btn_rename.configure(state="normal")
-        self.btn_delete.configure(state="normal")
-        self.btn_download.configure(state="normal")
-        self.tree.configure(selectmode="browse")
+        self._set_session_btns("normal")
+        self.tree.configure(selectmode="extended")
 
     def _set_disconnected_state(self) -> None:
         self.btn_connect.configure(state="normal")
-        self.btn_disconnect.configure(state="disabled")
-        self.btn_up.configure(state="disabled")
-        self.btn_mkdir.configure(state="disabled")
-        self.btn_newfile.configure(state="disabled")
-        self.btn_upload.configure(state="disabled")
-        self.btn_rename.configure(state="disabled")
-        self.btn_delete.configure(state="disabled")
-        self.btn_download.configure(state="disabled")
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self._set_session_btns("disabled")
+        self._clear_tree()
         self.lbl_path.configure(text="/")
 
+    def _ask_fields(self, title: str, labels: List[str]) -> Optional[List[str]]:
+        """Show one modal dialog with an entry per label.
+
+        Returns the entered strings (in label order), or None if cancelled.
+        """
+        dlg = tk.Toplevel(self.master)
+        dlg.title(title)
+        dlg.transient(self.master)
+        dlg.resizable(False, False)
+        dlg.columnconfigure(1, weight=1)
+
+        entries: List[ttk.Entry] = []
+        for row, label in enumerate(labels):
+            ttk.Label(dlg, text=label).grid(row=row, column=0, padx=6, pady=4, sticky="e")
+            ent = ttk.Entry(dlg, width=40)
+            ent.grid(row=row, column=1, padx=6, pady=4, sticky="ew")
+            entries.append(ent)
+
+        result: List[Optional[List[str]]] = [None]
+
+        def _ok(_event=None) -> None:
+            result[0] = [ent.get() for ent in entries]
+            dlg.destroy()
+
+        frm_btn = ttk.Frame(dlg)
+        frm_btn.grid(row=len(labels), column=0, columnspan=2, pady=6)
+        ttk.Button(frm_btn, text="OK", command=_ok).grid(row=0, column=0, padx=4)
+        ttk.Button(frm_btn, text="Cancel", command=dlg.destroy).grid(row=0, column=1, padx=4)
+        dlg.bind("<Return>", _ok)
+        dlg.bind("<Escape>", lambda _event: dlg.destroy())
+
+        entries[0].focus_set()
+        dlg.grab_set()
+        self.master.wait_window(dlg)
+        return result[0]
+
     def _ensure_connected(self) -> bool:
         if self.ftp is None:
             messagebox.showwarning("Not connected", "Please connect to a server first.")
@@ -198,49 +553,175 @@ class FTPClientGUI:
         return True
 
     # ------------- Directory listing -------------
-    def _refresh_list(self) -> None:
+    def _refresh_list(self, force: bool = False) -> None:
+        """Show the current directory, reusing a fresh cached listing.
+
+        With force=True (or on a cache miss) the directory is listed again,
+        with MLSD if the server supports it, else LIST.
+        """
         if not self._ensure_connected():
             return
 
-        ftp = self.ftp
-        assert ftp is not None
+        self._clear_tree()
 
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        # current_path is kept in sync by connect/change_dir/go_up, no PWD needed
+        path = self.current_path
+        self.lbl_path.configure(text=path)
 
-        try:
-            self.current_path = ftp.pwd()
-        except Exception:
-            pass
-        self.lbl_path.configure(text=self.current_path)
+        cached = None if force else self._cached_listing(path)
+        if cached is not None:
+            self._fill_tree(cached)
+            return
+        if path in self._queued_lists:
+            # A LIST of this path is already waiting and will redraw it
+            return
+        self._queued_lists.add(path)
 
-        entries: List[Tuple[str, str, Optional[int]]] = []  # (name, type, size)
+        def _list(ftp: FTPConnection) -> Listing:
+            # Taken off the set once running: later refreshes need a new LIST
+            self._queued_lists.discard(path)
+            return self._list_dir(ftp, path)
 
-        try:
-            lines = ftp.list_lines()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to list directory: {e}")
+        def _on_listed(listing: Listing) -> None:
+            now = time.monotonic()
+            self._list_cache[path] = (now, now + LIST_CACHE_TTL, listing)
+            if path == self.current_path:
+                self._clear_tree()
+                self._fill_tree(listing)
+
+        self._run_ftp(_list, _on_listed, "Failed to list directory")
+
+    @classmethod
+    def _list_dir(cls, ftp: FTPConnection, path: str) -> Listing:
+        """List the absolute path with MLSD if supported, else LIST; sorted.
+
+        An absolute path keeps the result independent of the connection's cwd.
+        """
+        if ftp.supports_mlsd():
+            listing = Listing()
+            add = listing.add
+            for name, ftype, size in ftp.list_mlsd(path):
+                add(name, ftype == "dir", -1 if size is None else size)
+        else:
+            listing = cls._parse_list(ftp.list_lines(path))
+        return listing.sorted()
+
+    def _prefetch_parent(self, path: str) -> None:
+        """Warm the listing cache for the parent of path in the background.
+
+        After entering a directory the next move is often "Up", so its
+        listing is fetched ahead of time on the prefetch worker, over a
+        connection of its own. Nothing is fetched if the parent is already
+        cached, and failures are ignored: it is only a warm-up.
+        """
+        parent = posixpath.dirname(path)
+        pool = self._prefetch_pool
+        if path == "/" or pool is None or self._cached_listing(parent) is not None:
             return
+        ftp = self.ftp
 
-        for line in lines:
-            parts = line.split(maxsplit=8)
-            if len(parts) < 9:
-                name = line.strip()
-                entries.append((name, "file", None))
-                continue
-            meta, _links, _owner, _group, size, _mon, _day, _time_year, name = parts
-            ftype = "dir" if meta.startswith("d") else "file"
+        def _job() -> None:
+            if self.ftp is not ftp:
+                return
+            started = time.monotonic()
             try:
-                size_int: Optional[int] = int(size) if ftype == "file" else None
-            except ValueError:
-                size_int = None
-            entries.append((name, ftype, size_int))
+                with pool.borrow() as conn:
+                    listing = self._list_dir(conn, parent)
+            except Exception:
+                return
+            self.master.after(0, _store, started, listing)
+
+        def _store(started: float, listing: Listing) -> None:
+            hit = self._list_cache.get(parent)
+            if self.ftp is ftp and (hit is None or hit[0] < started):
+                self._list_cache[parent] = (started, started + PREFETCH_CACHE_TTL, listing)
+
+        self._prefetch_q.put(_job)
+
+    @staticmethod
+    def _parse_list(lines: List[str]) -> Listing:
+        """Parse UNIX-style LIST lines, for servers without MLSD.
 
-        entries.sort(key=lambda x: (0 if x[1] == "dir" else 1, x[0].lower()))
+        Runs once per line of a listing, so the regex match and add
+        methods are bound to locals outside the loop.
+        """
+        listing = Listing()
+        add = listing.add
+        match = _LIST_RE.match
+        for line in lines:
+            m = match(line)
+            if m is None:
+                # Not UNIX-style: show the whole line as a file name
+                add(line.strip(), False)
+            elif m[1] == "d":
+                add(m[3], True)
+            else:
+                add(m[3], False, int(m[2]))
+        return listing
+
+    def _cached_listing(self, path: str) -> Optional[Listing]:
+        """Return the cached listing of path if it has not expired yet.
+
+        Entries are (fetched at, expires at, listing): a listing from a
+        refresh lives LIST_CACHE_TTL, a prefetched one PREFETCH_CACHE_TTL.
+        """
+        hit = self._list_cache.get(path)
+        if hit is None or time.monotonic() >= hit[1]:
+            return None
+        return hit[2]
+
+    def _patch_listing(self, change: Callable[[Listing], Listing],
+                       path: Optional[str] = None) -> None:
+        """Apply a local change (mkdir/delete/rename) to the shown listing.
+
+        The listing of the current directory, which is the one on screen,
+        is edited and redrawn without a LIST round trip, even if its TTL
+        ran out while a dialog was open; the patched entry then gets a new
+        LIST_CACHE_TTL. With nothing cached, re-list instead. If `path` is
+        given and the user has since left it, its cached listing is just
+        dropped.
+        """
+        if self.ftp is None:
+            return
+        if path is not None and path != self.current_path:
+            self._list_cache.pop(path, None)
+            return
+        path = self.current_path
+        hit = self._list_cache.get(path)
+        if hit is None:
+            self._refresh_list(force=True)
+            return
+        listing = change(hit[2]).sorted()
+        now = time.monotonic()
+        self._list_cache[path] = (now, now + LIST_CACHE_TTL, listing)
+        self._clear_tree()
+        self._fill_tree(listing)
 
-        for name, ftype, size in entries:
-            size_text = "" if size is None else str(size)
-            self.tree.insert("", "end", values=(name, size_text, ftype))
+    def _clear_tree(self) -> None:
+        self._fill_gen += 1
+        self.tree.delete(*self.tree.get_children())
+
+    def _fill_tree(self, listing: Listing) -> None:
+        """Insert a listing into the file list in TREE_BATCH-sized idle callbacks.
+
+        Large listings are added a batch at a time, so the Tk event loop keeps
+        handling input and redraws in between. Pending batches are dropped if
+        the list is cleared meanwhile.
+        """
+        gen = self._fill_gen
+        insert = self.tree.insert
+        row = listing.row
+        total = len(listing)
+
+        def _insert_batch(start: int) -> None:
+            if gen != self._fill_gen:
+                return
+            for i in range(start, min(start + TREE_BATCH, total)):
+                insert("", "end", values=row(i))
+            if start + TREE_BATCH < total:
+                self.master.after_idle(_insert_batch, start + TREE_BATCH)
+
+        _insert_batch(0)
 
     # ------------- Navigation -------------
     def _on_double_click(self, event) -> None:
@@ -251,59 +732,79 @@ class FTPClientGUI:
         if ftype == "dir":
             self.change_dir(name)
 
-    def change_dir(self, dirname: str) -> None:
+    def change_dir(self, dirname: str, error_text: str = "Failed to change directory") -> None:
         if not self._ensure_connected():
             return
-        ftp = self.ftp
-        assert ftp is not None
-        try:
-            ftp.cwd(dirname)
+
+        def _entered(_result: Any) -> None:
+            # Jobs finish in queue order, so this joins onto the right path
+            self.current_path = posixpath.normpath(posixpath.join(self.current_path, dirname))
             self._refresh_list()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to change directory: {e}")
+            self._prefetch_parent(self.current_path)
+
+        self._run_ftp(lambda ftp: ftp.cwd(dirname), _entered, error_text)
 
     def go_up(self) -> None:
+        """Go to the parent directory, at once if its listing is cached.
+
+        With a fresh cached (often prefetched) parent listing and no other
+        control job in flight, the parent is shown immediately and the CWD
+        follows in the background; if it fails, the view goes back.
+        Otherwise this is a plain change_dir("..").
+        """
         if not self._ensure_connected():
             return
-        ftp = self.ftp
-        assert ftp is not None
-        try:
-            ftp.cwd("..")
+        child = self.current_path
+        parent = posixpath.dirname(child)
+        if self._jobs_pending or self._cached_listing(parent) is None:
+            self.change_dir("..", "Failed to go up")
+            return
+
+        def _stay() -> None:
+            self.current_path = child
             self._refresh_list()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to go up: {e}")
+
+        self.current_path = parent
+        self._refresh_list()
+        self._prefetch_parent(parent)
+        self._run_ftp(lambda ftp: ftp.cwd(parent), lambda _result: None, "Failed to go up", _stay)
 
     # ------------- File operations -------------
-    def _get_selected(self):
-        item_id = self.tree.focus()
-        if not item_id:
-            return None
-        values = self.tree.item(item_id, "values")
-        if not values:
-            return None
-        name, _size, ftype = values
-        return name, ftype
+    def _get_selected(self) -> List[Tuple[str, str]]:
+        """Return (name, type) of every selected row, in display order.
+
+        The focused row is not used: it can sit outside the selection
+        after ctrl-clicks, and delete already acts on the selection.
+        """
+        selected = []
+        for item_id in self.tree.selection():
+            values = self.tree.item(item_id, "values")
+            if values:
+                name, _size, ftype = values
+                selected.append((name, ftype))
+        return selected
 
     def new_file(self) -> None:
         """Create a small text file on the server using STOR with in-memory data."""
         if not self._ensure_connected():
             return
-        filename = simpledialog.askstring("New file", "File name:", parent=self.master)
-        if not filename:
+        fields = self._ask_fields("New file", ["File name:", "Initial content (optional):"])
+        if not fields or not fields[0]:
             return
-        content = simpledialog.askstring("New file", "Initial content (optional):", parent=self.master)
-        if content is None:
-            content = ""
+        filename, content = fields
         data = content.encode("utf-8")
-        ftp = self.ftp
-        assert ftp is not None
-        from io import BytesIO
-        try:
-            bio = BytesIO(data)
-            ftp.stor_binary(filename, bio)
-            self._refresh_list()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to create file: {e}")
+
+        def _store(ftp: FTPConnection) -> None:
+            # Filled here, on the worker, so queued jobs cannot overwrite it
+            scratch = self._scratch
+            scratch.seek(0)
+            scratch.truncate()
+            scratch.write(data)
+            scratch.seek(0)
+            ftp.stor_binary(filename, scratch)
+
+        self._run_ftp(_store, lambda _result: self._refresh_list(force=True),
+                      "Failed to create file")
 
     def upload(self) -> None:
         """Upload a local file to the current remote directory using STOR."""
@@ -313,84 +814,136 @@ class FTPClientGUI:
         if not local_path:
             return
         filename = os.path.basename(local_path)
-        ftp = self.ftp
-        assert ftp is not None
+        pool = self._pool
+        assert pool is not None
+        remote_dir = self.current_path
+        remote_path = posixpath.join(remote_dir, filename)
 
-        def _do_upload():
-            self._set_status(f"Uploading {filename} ...")
-            try:
-                with open(local_path, "rb") as f:
-                    ftp.stor_binary(filename, f)
-                self._set_status(f"Uploaded {filename}")
-                self._refresh_list()
-            except Exception as e:
-                self._set_status("Upload failed")
-                messagebox.showerror("Error", f"Failed to upload file: {e}")
+        def _do_upload() -> None:
+            with open(local_path, "rb") as f, pool.borrow() as conn:
+                conn.stor_binary(remote_path, f)
+
+        def _on_uploaded(_result: Any) -> None:
+            self._set_status(f"Uploaded {filename}")
+            self._list_cache.pop(remote_dir, None)
+            if remote_dir == self.current_path and self.ftp is not None:
+                self._refresh_list(force=True)
 
-        threading.Thread(target=_do_upload, daemon=True).start()
+        self._set_status(f"Uploading {filename} ...")
+        self._submit(_do_upload, _on_uploaded, "Failed to upload file")
 
     def mkdir(self) -> None:
         if not self._ensure_connected():
             return
-        dirname = simpledialog.askstring("New folder", "Folder name:", parent=self.master)
-        if not dirname:
+        fields = self._ask_fields("New folder", ["Folder name:"])
+        if not fields or not fields[0]:
             return
-        ftp = self.ftp
-        assert ftp is not None
-        try:
-            ftp.mkd(dirname)
-            self._refresh_list()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to create folder: {e}")
+        dirname = fields[0]
+
+        def _add_dir(listing: Listing) -> Listing:
+            listing = listing.without({dirname})
+            listing.add(dirname, True)
+            return listing
+
+        def _created(_result: Any) -> None:
+            if "/" in dirname:
+                self._refresh_list(force=True)
+            else:
+                self._patch_listing(_add_dir)
+
+        self._run_ftp(lambda ftp: ftp.mkd(dirname), _created, "Failed to create folder")
 
     def rename(self) -> None:
         if not self._ensure_connected():
             return
         selected = self._get_selected()
-        if not selected:
-            messagebox.showinfo("Rename", "Please select a file or folder.")
+        if len(selected) != 1:
+            messagebox.showinfo("Rename", "Please select exactly one file or folder.")
             return
-        old_name, _ftype = selected
+        old_name, _ftype = selected[0]
         new_name = simpledialog.askstring("Rename", f"New name for '{old_name}':", parent=self.master)
         if not new_name or new_name == old_name:
             return
-        ftp = self.ftp
-        assert ftp is not None
-        try:
-            ftp.rename(old_name, new_name)
-            self._refresh_list()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to rename: {e}")
+
+        def _rename(listing: Listing) -> Listing:
+            # An existing entry called new_name is replaced by the rename
+            listing = listing.without({new_name})
+            i = listing.index(old_name)
+            if i >= 0:
+                listing.names[i] = new_name
+            return listing
+
+        def _renamed(_result: Any) -> None:
+            if "/" in new_name:
+                self._refresh_list(force=True)
+            else:
+                self._patch_listing(_rename)
+
+        self._run_ftp(lambda ftp: ftp.rename(old_name, new_name), _renamed, "Failed to rename")
 
     def delete(self) -> None:
+        """Delete all selected entries, PARALLEL_PARTS at a time.
+
+        Each DELE/RMD runs on its own pooled control connection, so N
+        entries take about N / PARALLEL_PARTS round trips instead of N.
+        """
         if not self._ensure_connected():
             return
         selected = self._get_selected()
         if not selected:
             messagebox.showinfo("Delete", "Please select a file or folder.")
             return
-        name, ftype = selected
-        if not messagebox.askyesno("Confirm delete", f"Are you sure you want to delete '{name}'?"):
+        if len(selected) == 1:
+            question = f"Are you sure you want to delete '{selected[0][0]}'?"
+        else:
+            question = f"Are you sure you want to delete {len(selected)} items?"
+        if not messagebox.askyesno("Confirm delete", question):
             return
-        ftp = self.ftp
-        assert ftp is not None
-        try:
-            if ftype == "dir":
-                ftp.rmd(name)
-            else:
-                ftp.delete(name)
-            self._refresh_list()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to delete: {e}")
+        pool = self._pool
+        assert pool is not None
+        remote_dir = self.current_path
+
+        def _remove(name: str, ftype: str) -> None:
+            path = posixpath.join(remote_dir, name)
+            with pool.borrow() as conn:
+                if ftype == "dir":
+                    conn.rmd(path)
+                else:
+                    conn.delete(path)
+
+        def _do_delete() -> Tuple[List[str], List[str]]:
+            with ThreadPoolExecutor(max_workers=min(len(selected), PARALLEL_PARTS)) as workers:
+                futures = [(name, workers.submit(_remove, name, ftype))
+                           for name, ftype in selected]
+            deleted: List[str] = []
+            errors: List[str] = []
+            for name, future in futures:
+                error = future.exception()
+                if error is None:
+                    deleted.append(name)
+                else:
+                    errors.append(f"{name}: {error}")
+            return deleted, errors
+
+        def _on_deleted(result: Tuple[List[str], List[str]]) -> None:
+            deleted, errors = result
+            gone = set(deleted)
+            self._patch_listing(lambda listing: listing.without(gone), remote_dir)
+            self._set_status(f"Deleted {len(deleted)} of {len(selected)} items")
+            for error in errors:
+                self._report_error(f"Failed to delete {error}")
+
+        self._set_status(f"Deleting {len(selected)} items ...")
+        self._submit(_do_delete, _on_deleted, "Failed to delete")
 
     def download(self) -> None:
         if not self._ensure_connected():
             return
         selected = self._get_selected()
-        if not selected:
-            messagebox.showinfo("Download", "Please select a file to download.")
+        if len(selected) != 1:
+            messagebox.showinfo("Download", "Please select exactly one file to download.")
             return
-        name, ftype = selected
+        name, ftype = selected[0]
         if ftype == "dir":
             messagebox.showinfo("Download", "Folder download is not implemented in this simple client.")
             return
@@ -399,20 +952,98 @@ class FTPClientGUI:
         if not local_path:
             return
 
-        ftp = self.ftp
-        assert ftp is not None
+        # A partial earlier download can be continued with REST
+        resume_from = 0
+        local_size = os.path.getsize(local_path) if os.path.isfile(local_path) else 0
+        if local_size and messagebox.askyesno(
+            "Resume download",
+            f"'{local_path}' already has {local_size} bytes.\n"
+            "Resume the download from there? (No starts over.)",
+        ):
+            resume_from = local_size
 
-        def _do_download():
-            self._set_status(f"Downloading {name} ...")
-            try:
-                with open(local_path, "wb") as f:
-                    ftp.retr_binary(name, f.write)
+        pool = self._pool
+        assert pool is not None
+        remote_path = posixpath.join(self.current_path, name)
+
+        def _do_download() -> int:
+            """Download into local_path; return the byte offset it started at."""
+            flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+            start = resume_from
+            total: Optional[int] = None
+            with pool.borrow() as conn:
+                # Ranges and resuming need SIZE and REST; otherwise one full stream
+                try:
+                    total = conn.size(remote_path)
+                    conn.rest(0)
+                except FTPProtocolError:
+                    total, start = None, 0
+                if total is not None and start > total:
+                    # Local file is longer than the remote one: not a prefix of it
+                    start = 0
+                progress = self._download_progress(name, None if total is None else total - start)
+                if total is None or total - start < PARALLEL_MIN_SIZE or not hasattr(os, "pwrite"):
+                    fd = os.open(local_path, flags, 0o644)
+                    try:
+                        os.ftruncate(fd, start)
+                        os.lseek(fd, start, os.SEEK_SET)
+                        if total is None or start < total:
+                            conn.retr_to_fd(remote_path, fd, rest=start or None, progress=progress)
+                    finally:
+                        os.close(fd)
+                    return start
+            # Outside the borrow, so all PARALLEL_PARTS connections are free
+            self._download_parallel(pool, remote_path, local_path, total, start, progress)
+            return start
+
+        def _on_downloaded(start: int) -> None:
+            if start:
+                self._set_status(f"Downloaded {name} to {local_path} (resumed at byte {start})")
+            else:
                 self._set_status(f"Downloaded {name} to {local_path}")
-            except Exception as e:
-                self._set_status("Download failed")
-                messagebox.showerror("Error", f"Failed to download file: {e}")
 
-        threading.Thread(target=_do_download, daemon=True).start()
+        self._set_status(f"Downloading {name} ...")
+        self._submit(_do_download, _on_downloaded, "Failed to download file")
+
+    @staticmethod
+    def _download_parallel(pool: FTPConnectionPool, remote_path: str,
+                           local_path: str, total: int, start: int = 0,
+                           progress: Optional[Callable[[int], None]] = None) -> None:
+        """Download bytes [start, total) as PARALLEL_PARTS ranges over pooled connections.
+
+        Each range is fetched with REST + RETR on its own control connection
+        and written into a preallocated local file with os.pwrite(). The
+        first `start` bytes of an existing local file are kept. If a range
+        fails, the file is cut back to the ranges completed in order from
+        `start`, so its length is again a valid point to resume from.
+        progress(n), if given, is called from the range threads as data arrives.
+        """
+        step = -(-(total - start) // PARALLEL_PARTS)
+        ranges = [(offset, min(step, total - offset)) for offset in range(start, total, step)]
+        done = [False] * len(ranges)
+
+        def _fetch(index: int) -> None:
+            with pool.borrow() as conn:
+                conn.retr_range(remote_path, fd, *ranges[index], progress=progress)
+            done[index] = True
+
+        fd = os.open(local_path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, start)
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, total)
+            else:
+                os.ftruncate(fd, total)
+            try:
+                with ThreadPoolExecutor(max_workers=len(ranges)) as workers:
+                    # list() re-raises the first worker error, if any
+                    list(workers.map(_fetch, range(len(ranges))))
+            except BaseException:
+                # The executor has waited for all ranges, so done[] is final
+                os.ftruncate(fd, next(rng[0] for rng, ok in zip(ranges, done) if not ok))
+                raise
+        finally:
+            os.close(fd)
 
 
 def main() -> None:
@@ -422,4 +1053,5 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     main()
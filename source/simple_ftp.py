@@ -12,14 +12,72 @@ It is designed to be imported and used by a GUI or other applications.
 
 from __future__ import annotations
 
+import os
+import queue
+import re
 import socket
-from typing import List, Optional, Tuple, Callable, BinaryIO
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Set, Tuple, Callable, BinaryIO
+
+# Chunk size for data connection reads/writes. Larger blocks mean far fewer
+# send()/recv() calls per file than the classic 4-8 KiB.
+BLOCK_SIZE = 1 << 20
+# Kernel socket buffer size requested for data connections (SO_SNDBUF/SO_RCVBUF).
+DATA_SOCKET_BUFFER = 1 << 20
+# Upper bound for the buffer size chosen by FTPConnection.autotune_buffers();
+# DATA_SOCKET_BUFFER is the lower one
+MAX_SOCKET_BUFFER = 4 << 20
+# Max commands written back-to-back before reading their replies, so the
+# server's receive buffer never fills while we are not reading.
+PIPELINE_BATCH = 16
+# Longest control reply line accepted, so a broken or hostile server
+# cannot make _readline() buffer without bound
+MAX_LINE = 8192
+# Read buffer of the control connection's file object
+CONTROL_BUFFER = 1 << 16
+# Seconds between checks while FTPConnectionPool waits for a free connection
+POOL_WAIT_POLL = 0.5
+
+
+# Address in a PASV reply: "227 Entering Passive Mode (h1,h2,h3,h4,p1,p2)."
+_PASV_RE = re.compile(r"\((\d+),(\d+),(\d+),(\d+),(\d+),(\d+)\)")
+# Port in an EPSV reply (RFC 2428): "229 Entering Extended Passive Mode (|||port|)"
+# The delimiter is usually "|" but any one character is allowed.
+_EPSV_RE = re.compile(r"\((.)\1\1(\d+)\1\)")
 
 
 class FTPProtocolError(Exception):
     """Raised when the FTP server returns an unexpected reply."""
 
 
+def _reply_code(line: bytes) -> int:
+    """Return the 3-digit reply code at the start of a raw control line.
+
+    Works on the byte values directly instead of isdigit() + int() on a
+    decoded slice. A byte is a digit iff (byte - 48) is in 0..9: negative
+    differences have bits set outside the low nibble, 10..15 fail the > 9
+    test.
+    """
+    if len(line) < 3:
+        raise FTPProtocolError(f"Invalid reply: {line!r}")
+    c0, c1, c2 = line[0] - 48, line[1] - 48, line[2] - 48
+    if (c0 | c1 | c2) & ~0x0F or c0 > 9 or c1 > 9 or c2 > 9:
+        raise FTPProtocolError(f"Invalid reply: {line!r}")
+    return c0 * 100 + c1 * 10 + c2
+
+
+def _has_fileno(fileobj: BinaryIO) -> bool:
+    """Return True if fileobj is backed by a real OS file descriptor."""
+    try:
+        fileobj.fileno()
+    except (AttributeError, OSError, ValueError):
+        return False
+    return True
+
+
 class FTPConnection:
     """Very small FTP client based directly on TCP sockets.
 
@@ -29,16 +87,22 @@ class FTPConnection:
     - pwd(), cwd(path)
     - mkd(dirname), rmd(dirname)
     - delete(filename), rename(old, new)
-    - list_lines()
+    - list_lines(path=""), list_mlsd(path=""), feat(), supports_mlsd()
     - retr_binary(filename, callback)
     - stor_binary(filename, fileobj)
+    - retr_to_fd(filename, fd, rest=None)
+    - size(filename), rest(offset), retr_range(filename, fd, offset, length)
     - quit()
 
+    If an ssl.SSLContext is given, connect() upgrades the control connection
+    with AUTH TLS and login() switches data connections to TLS (PBSZ 0 /
+    PROT P), i.e. explicit FTPS.
+
     This is a teaching/demo implementation and omits many details of
     the full FTP specification.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, context: Optional[ssl.SSLContext] = None) -> None:
         # Control connection socket
         self.sock: Optional[socket.socket] = None
         # Buffered file-like object wrapping the control socket for convenient readline()
@@ -47,23 +111,37 @@ class FTPConnection:
         self.port: int = 21
         # Encoding used for control connection replies and commands
         self.encoding: str = "utf-8"
+        # TLS context for explicit FTPS, or None for plain FTP
+        self.context = context
+        # True once PROT P is in effect (data connections use TLS)
+        self._prot_p = False
+        # True once TYPE I has been accepted; it holds for the whole session
+        self._type_binary = False
+        # Upper-cased FEAT lines of this session, None until asked
+        self._features: Optional[List[str]] = None
+        # SO_SNDBUF/SO_RCVBUF for data connections, see autotune_buffers()
+        self.data_bufsize: int = DATA_SOCKET_BUFFER
+        # Data socket of the latest transfer, for abort()
+        self._data_sock: Optional[socket.socket] = None
 
     # ----------- Basic socket helpers -----------
-    def _readline(self) -> str:
+    def _readline(self) -> bytes:
         """Read a single line (ending with \r\n) from the control connection.
 
-        Example server reply: "220 Welcome...\r\n".
-        We read bytes until newline and then decode.
+        Example server reply: b"220 Welcome...\r\n".
+        The line is returned as raw bytes without the line ending; only
+        _read_response() decodes, and only the text it returns.
         """
         if self.file is None:
             raise FTPProtocolError("Control connection not open")
-        line = self.file.readline()
+        line = self.file.readline(MAX_LINE)
         if not line:
             raise FTPProtocolError("Connection closed by server")
-        # FTP uses ASCII-compatible encodings for replies.
-        return line.decode(self.encoding, errors="ignore").rstrip("\r\n")
+        if len(line) == MAX_LINE and not line.endswith(b"\n"):
+            raise FTPProtocolError(f"Reply line longer than {MAX_LINE} bytes")
+        return line.rstrip(b"\r\n")
 
-    def _read_response(self) -> Tuple[int, str]:
+    def _read_response(self, lines: Optional[List[bytes]] = None) -> Tuple[int, str]:
         """Read a server response and return (code, last_line_text).
 
         FTP replies can be single-line or multi-line:
@@ -72,65 +150,123 @@ class FTPConnection:
                           ...more lines...
                          "227 Last line"\r\n
         We always return the numeric code and the text of the last line.
+        If `lines` is given, the raw lines before the last one are appended
+        to it (needed for FEAT).
         """
         line = self._readline()
-        if len(line) < 3 or not line[:3].isdigit():
-            raise FTPProtocolError(f"Invalid reply: {line}")
-
-        code = int(line[:3])
-        text = line[4:] if len(line) > 3 else ""
+        code = _reply_code(line)
 
         # Multi-line reply: first line like "227-..."
-        if len(line) >= 4 and line[3] == "-":
-            prefix = f"{code} "
+        if line[3:4] == b"-":
+            prefix = line[:3] + b" "
             # Read until we find a line starting with "<code> "
             while True:
-                next_line = self._readline()
-                if next_line.startswith(prefix):
-                    text = next_line[4:] if len(next_line) > 3 else ""
+                if lines is not None:
+                    lines.append(line)
+                line = self._readline()
+                if line.startswith(prefix):
                     break
-        return code, text
+        # FTP uses ASCII-compatible encodings for replies.
+        return code, line[4:].decode(self.encoding, errors="ignore")
 
-    def _send_cmd(self, cmd: str) -> Tuple[int, str]:
-        """Send a command like 'USER name' and return the server response.
+    def _send_bytes(self, cmd: bytes) -> Tuple[int, str]:
+        """Send a command like b'USER name' and return the server response.
 
-        Returns (code, text) where code is an integer (e.g. 220, 230).
+        Callers build the command as bytes (b"CWD " + path.encode(...)), so
+        there is no f-string plus re-encode per command; the CRLF is added
+        here. Returns (code, text) where code is an integer (e.g. 220, 230).
         """
         if self.sock is None:
             raise FTPProtocolError("Not connected")
-        data = (cmd + "\r\n").encode(self.encoding)
-        self.sock.sendall(data)
+        self.sock.sendall(cmd + b"\r\n")
         return self._read_response()
 
+    def _send_bytes_lines(self, cmd: bytes, lines: List[bytes]) -> Tuple[int, str]:
+        """Like _send_bytes(), also collecting a multi-line reply's lines."""
+        self._write_cmds([cmd])
+        return self._read_response(lines)
+
+    def _write_cmds(self, cmds: List[bytes]) -> None:
+        """Send commands in one write, without reading any reply."""
+        if self.sock is None:
+            raise FTPProtocolError("Not connected")
+        self.sock.sendall(b"\r\n".join(cmds) + b"\r\n")
+
+    def _send_pipelined(self, cmds: List[bytes]) -> List[Tuple[int, str]]:
+        """Send several commands without waiting for each reply (pipelining).
+
+        Commands are written back-to-back in batches of PIPELINE_BATCH and
+        the replies, which arrive in order, are read afterwards. This costs
+        about one round trip per batch instead of one per command.
+        Returns a list of (code, text), one per command.
+        """
+        replies: List[Tuple[int, str]] = []
+        for i in range(0, len(cmds), PIPELINE_BATCH):
+            batch = cmds[i : i + PIPELINE_BATCH]
+            self._write_cmds(batch)
+            for _ in batch:
+                replies.append(self._read_response())
+        return replies
+
     # ----------- Public high-level API -----------
     def connect(self, host: str, port: int = 21, timeout: int = 10) -> None:
         """Open TCP connection to FTP server and read the welcome banner."""
         self.host = host
         self.port = port
+        self._prot_p = False
+        self._type_binary = False
+        self._features = None
         self.sock = socket.create_connection((host, port), timeout=timeout)
+        # Commands and replies are tiny: disable Nagle so they are not held
+        # back waiting for a delayed ACK. Data sockets keep Nagle on.
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if hasattr(socket, "TCP_QUICKACK"):  # Linux only
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
         # Wrap the socket in a buffered file-like object for readline()
-        self.file = self.sock.makefile('rb')
+        self.file = self.sock.makefile('rb', buffering=CONTROL_BUFFER)
 
         code, text = self._read_response()
         if code != 220:
             raise FTPProtocolError(f"Unexpected welcome reply: {code} {text}")
+        if self.context is not None:
+            self._auth_tls()
+
+    def _auth_tls(self) -> None:
+        """Upgrade the control connection to TLS with AUTH TLS."""
+        assert self.context is not None and self.sock is not None
+        code, text = self._send_bytes(b"AUTH TLS")
+        if code != 234:
+            raise FTPProtocolError(f"AUTH TLS failed: {code} {text}")
+        if self.file is not None:
+            self.file.close()
+        self.sock = self.context.wrap_socket(self.sock, server_hostname=self.host)
+        self.file = self.sock.makefile('rb', buffering=CONTROL_BUFFER)
 
     def login(self, user: str = "anonymous", password: str = "") -> None:
         """Send USER/PASS to log in to the FTP server."""
-        code, _ = self._send_cmd(f"USER {user}")
-        if code == 230:
-            # Logged in without needing PASS
-            return
+        code, _ = self._send_bytes(b"USER " + user.encode(self.encoding))
         if code == 331:
-            code2, text2 = self._send_cmd(f"PASS {password}")
+            code2, text2 = self._send_bytes(b"PASS " + password.encode(self.encoding))
             if code2 not in (230, 202):
                 raise FTPProtocolError(f"Login failed: {code2} {text2}")
-        else:
+        elif code != 230:  # 230: logged in without needing PASS
             raise FTPProtocolError(f"USER command failed: {code}")
+        if self.context is not None:
+            self._prot_p_setup()
+
+    def _prot_p_setup(self) -> None:
+        """Protect data connections with TLS (PBSZ 0 + PROT P)."""
+        code, text = self._send_bytes(b"PBSZ 0")
+        if code != 200:
+            raise FTPProtocolError(f"PBSZ failed: {code} {text}")
+        code, text = self._send_bytes(b"PROT P")
+        if code != 200:
+            raise FTPProtocolError(f"PROT failed: {code} {text}")
+        self._prot_p = True
 
     def pwd(self) -> str:
         """Return the current working directory using PWD."""
-        code, text = self._send_cmd("PWD")
+        code, text = self._send_bytes(b"PWD")
         if code != 257:
             raise FTPProtocolError(f"PWD failed: {code} {text}")
         # Typical response: 257 "/" is current directory
@@ -145,155 +281,553 @@ class FTPConnection:
 
     def cwd(self, path: str) -> None:
         """Change working directory."""
-        code, text = self._send_cmd(f"CWD {path}")
+        code, text = self._send_bytes(b"CWD " + path.encode(self.encoding))
         if code != 250:
             raise FTPProtocolError(f"CWD failed: {code} {text}")
 
     def mkd(self, dirname: str) -> None:
         """Create a directory on the server."""
-        code, text = self._send_cmd(f"MKD {dirname}")
+        code, text = self._send_bytes(b"MKD " + dirname.encode(self.encoding))
         if code not in (257, 250):
             raise FTPProtocolError(f"MKD failed: {code} {text}")
 
     def rmd(self, dirname: str) -> None:
         """Remove a directory on the server."""
-        code, text = self._send_cmd(f"RMD {dirname}")
+        code, text = self._send_bytes(b"RMD " + dirname.encode(self.encoding))
         if code != 250:
             raise FTPProtocolError(f"RMD failed: {code} {text}")
 
     def delete(self, filename: str) -> None:
         """Delete a file on the server."""
-        code, text = self._send_cmd(f"DELE {filename}")
+        code, text = self._send_bytes(b"DELE " + filename.encode(self.encoding))
         if code != 250:
             raise FTPProtocolError(f"DELE failed: {code} {text}")
 
     def rename(self, old: str, new: str) -> None:
-        """Rename a file or directory on the server."""
-        code, text = self._send_cmd(f"RNFR {old}")
+        """Rename a file or directory on the server.
+
+        RNFR and RNTO are pipelined. If RNFR is refused the server answers
+        the following RNTO with 503, and the RNFR error is reported.
+        """
+        (code, text), (code2, text2) = self._send_pipelined(
+            [b"RNFR " + old.encode(self.encoding), b"RNTO " + new.encode(self.encoding)]
+        )
         if code != 350:
             raise FTPProtocolError(f"RNFR failed: {code} {text}")
-        code2, text2 = self._send_cmd(f"RNTO {new}")
         if code2 != 250:
             raise FTPProtocolError(f"RNTO failed: {code2} {text2}")
 
+    def size(self, filename: str) -> int:
+        """Return the size of a remote file in bytes using SIZE."""
+        code, text = self._send_bytes(b"SIZE " + filename.encode(self.encoding))
+        if code != 213:
+            raise FTPProtocolError(f"SIZE failed: {code} {text}")
+        try:
+            return int(text.split()[0])
+        except (IndexError, ValueError):
+            raise FTPProtocolError(f"Invalid SIZE reply: {text}")
+
+    def rest(self, offset: int) -> None:
+        """Set the restart offset for the next RETR/STOR using REST."""
+        code, text = self._send_bytes(b"REST %d" % offset)
+        if code != 350:
+            raise FTPProtocolError(f"REST failed: {code} {text}")
+
+    def feat(self) -> List[str]:
+        """Return the server's extensions from FEAT, e.g. ["MLST type*;size*;", "SIZE"]."""
+        lines: List[bytes] = []
+        code, text = self._send_bytes_lines(b"FEAT", lines)
+        return self._store_features(code, text, lines)
+
+    def _store_features(self, code: int, text: str, lines: List[bytes]) -> List[str]:
+        """Check a FEAT reply, remember its feature lines and return them."""
+        if code != 211:
+            # No FEAT (RFC 959-only server): assume no extensions
+            self._features = []
+            raise FTPProtocolError(f"FEAT failed: {code} {text}")
+        # Feature lines are the ones between "211-..." and "211 End"
+        features = [line.decode(self.encoding, errors="ignore").strip() for line in lines[1:]]
+        self._features = [feature.upper() for feature in features]
+        return features
+
+    def _has_feature(self, *names: str) -> bool:
+        """Return True if FEAT lists one of `names`. FEAT is sent once per session."""
+        if self._features is None:
+            try:
+                self.feat()
+            except FTPProtocolError:
+                pass
+        assert self._features is not None
+        return any(feature.split(" ", 1)[0] in names for feature in self._features)
+
+    def supports_mlsd(self) -> bool:
+        """Return True if FEAT advertises MLST/MLSD."""
+        return self._has_feature("MLST", "MLSD")
+
+    def autotune_buffers(self, bandwidth: float = 100e6, probes: int = 3) -> int:
+        """Size data socket buffers to the bandwidth-delay product.
+
+        The round-trip time is the best of `probes` NOOP exchanges on the
+        control connection; `bandwidth` is the assumed link speed in bit/s.
+        The result is clamped to [DATA_SOCKET_BUFFER, MAX_SOCKET_BUFFER],
+        stored in self.data_bufsize and returned. So the buffers only grow
+        past the fixed default on long, fast paths: a smaller value would
+        just cap throughput, since setting SO_RCVBUF also turns off the
+        kernel's own receive buffer autotuning. (On Linux the kernel caps
+        it further at net.core.wmem_max / rmem_max.)
+        """
+        rtt = float("inf")
+        for _ in range(probes):
+            start = time.perf_counter()
+            self._send_bytes(b"NOOP")
+            rtt = min(rtt, time.perf_counter() - start)
+        bdp = int(bandwidth * rtt / 8)
+        self.data_bufsize = max(DATA_SOCKET_BUFFER, min(MAX_SOCKET_BUFFER, bdp))
+        return self.data_bufsize
+
     def quit(self) -> None:
         """Politely close the FTP session and underlying socket."""
         if self.sock is None:
             return
         try:
-            self._send_cmd("QUIT")
+            self._send_bytes(b"QUIT")
         except Exception:
             pass
+        self._close_socket()
+
+    def _close_socket(self) -> None:
+        """Close the control connection without QUIT (e.g. once out of sync)."""
         try:
             if self.file is not None:
                 self.file.close()
         finally:
             self.file = None
         try:
-            self.sock.close()
+            if self.sock is not None:
+                self.sock.close()
         finally:
             self.sock = None
 
+    def abort(self) -> None:
+        """Shut down the control and data connections, from any thread.
+
+        A transfer blocked on either socket fails at once instead of
+        running to completion; the connection is unusable afterwards and
+        should be closed with quit() by its user.
+        """
+        for sock in (self._data_sock, self.sock):
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass  # already closed
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the control connection is still open."""
+        return self.sock is not None
+
     # ----------- Passive mode data connection helpers -----------
-    def _enter_passive_mode(self) -> socket.socket:
-        """Send PASV and open a data connection to the returned address.
+    def _open_passive(self, epsv: bool, text: str) -> socket.socket:
+        """Open a data connection to the address in a PASV or EPSV reply.
 
         PASV reply example (RFC 959):
             227 Entering Passive Mode (h1,h2,h3,h4,p1,p2).
-
         Data port = p1*256 + p2 on host h1.h2.h3.h4.
+
+        EPSV reply example (RFC 2428):
+            229 Entering Extended Passive Mode (|||6446|)
+        Only the port is given; the host is the control connection's peer,
+        which also works over IPv6.
+        """
+        assert self.sock is not None
+        if epsv:
+            m = _EPSV_RE.search(text)
+            if m is None:
+                raise FTPProtocolError(f"Invalid EPSV reply: {text}")
+            data_host = self.sock.getpeername()[0]
+            data_port = int(m[2])
+        else:
+            m = _PASV_RE.search(text)
+            if m is None:
+                raise FTPProtocolError(f"Invalid PASV reply: {text}")
+            data_host = f"{m[1]}.{m[2]}.{m[3]}.{m[4]}"
+            data_port = int(m[5]) * 256 + int(m[6])
+
+        # Same timeout as the control connection, so an unreachable passive
+        # address (common behind NAT) fails instead of hanging
+        data_sock = socket.create_connection((data_host, data_port),
+                                             timeout=self.sock.gettimeout())
+        # Large kernel buffers keep the pipe full on high bandwidth-delay links
+        data_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.data_bufsize)
+        data_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.data_bufsize)
+        return data_sock
+
+    def _transfer_cmd(self, cmd: bytes, rest: Optional[int] = None) -> socket.socket:
+        """Start a transfer: TYPE I (once), optional REST, EPSV/PASV, then `cmd`.
+
+        EPSV is used if FEAT lists it, else PASV. It and `cmd` are written
+        together, and the data connection is opened as soon as its reply
+        arrives, so a transfer costs one round trip before data flows
+        instead of three. The server reads `cmd` only after answering, so
+        both replies come in order. The first transfer of a session sends
+        TYPE I, pipelined with FEAT if the features are not known yet.
+
+        Returns the connected data socket once the server has answered the
+        transfer command with 125/150. Under PROT P the socket is wrapped in
+        TLS here, resuming the control connection's TLS session.
         """
-        code, text = self._send_cmd("PASV")
-        if code != 227:
-            raise FTPProtocolError(f"PASV failed: {code} {text}")
-
-        # Extract the numbers inside parentheses
-        start = text.find('(')
-        end = text.find(')', start + 1)
-        if start == -1 or end == -1:
-            raise FTPProtocolError(f"Invalid PASV reply: {text}")
-        nums = text[start + 1 : end].split(',')
-        if len(nums) != 6:
-            raise FTPProtocolError(f"Invalid PASV address: {text}")
-        h1, h2, h3, h4, p1, p2 = nums
-        data_host = f"{h1}.{h2}.{h3}.{h4}"
-        data_port = int(p1) * 256 + int(p2)
-
-        return socket.create_connection((data_host, data_port))
+        if not self._type_binary:
+            if self._features is None:
+                self._write_cmds([b"TYPE I", b"FEAT"])
+                code, text = self._read_response()
+                lines: List[bytes] = []
+                try:
+                    self._store_features(*self._read_response(lines), lines)
+                except FTPProtocolError:
+                    pass
+            else:
+                code, text = self._send_bytes(b"TYPE I")
+            if code != 200:
+                raise FTPProtocolError(f"TYPE failed: {code} {text}")
+            self._type_binary = True
+        if rest is not None:
+            self.rest(rest)
+        epsv = self._has_feature("EPSV")
+        passive = b"EPSV" if epsv else b"PASV"
+        self._write_cmds([passive, cmd])
+        code, text = self._read_response()
+        if code != (229 if epsv else 227):
+            # `cmd` was sent anyway; read its (error) reply to stay in sync
+            self._read_response()
+            raise FTPProtocolError(f"{passive.decode()} failed: {code} {text}")
+        try:
+            data_sock = self._open_passive(epsv, text)
+        except Exception:
+            # The reply to `cmd` is still pending, and the server may wait for
+            # the data connection before sending it: the control connection
+            # can't be brought back in sync, so it is closed
+            self._close_socket()
+            raise
+        code, text = self._read_response()
+        if code not in (125, 150):
+            data_sock.close()
+            raise FTPProtocolError(f"{cmd.split(b' ', 1)[0].decode()} failed: {code} {text}")
+        if self._prot_p:
+            assert self.context is not None and isinstance(self.sock, ssl.SSLSocket)
+            data_sock = self.context.wrap_socket(
+                data_sock, server_hostname=self.host, session=self.sock.session
+            )
+        self._data_sock = data_sock
+        return data_sock
 
     # ----------- LIST / RETR / STOR using data connection -----------
-    def list_lines(self) -> List[str]:
+    def list_lines(self, path: str = "") -> List[str]:
         """Return directory listing as a list of lines of text.
 
+        Lists `path` if given, else the current working directory.
+
         Implementation steps:
         - Set binary mode with TYPE I (safer for arbitrary bytes)
-        - Enter PASV to open a data connection
-        - Send LIST on the control connection
-        - Read all data from the data connection
+        - Send PASV and LIST together, open the data connection
+        - Read the data connection line by line through a buffered reader
+          (no growing bytes buffer, which would copy quadratically)
         - Read the final 226/250 reply on the control connection
         """
-        self._send_cmd("TYPE I")
+        return self._data_lines(b"LIST " + path.encode(self.encoding) if path else b"LIST")
 
-        data_sock = self._enter_passive_mode()
-        code, text = self._send_cmd("LIST")
-        if code not in (125, 150):
-            data_sock.close()
-            raise FTPProtocolError(f"LIST failed: {code} {text}")
+    def list_mlsd(self, path: str = "") -> List[Tuple[str, str, Optional[int]]]:
+        """Return a machine-readable listing (MLSD, RFC 3659) of `path`.
+
+        Each entry is (name, "dir" or "file", size in bytes or None). The
+        "type" and "size" facts replace guessing at UNIX-style LIST columns.
+        The "." and ".." entries (type=cdir / type=pdir) are skipped.
+        Check supports_mlsd() first; otherwise use list_lines().
+        """
+        entries: List[Tuple[str, str, Optional[int]]] = []
+        # Bound once: the loop below runs per line and per fact
+        append = entries.append
+        partition = str.partition
+        for line in self._data_lines(b"MLSD " + path.encode(self.encoding) if path else b"MLSD"):
+            # "type=file;size=1234;modify=...; name" - facts, one space, name
+            facts_text, _, name = partition(line, " ")
+            facts = {}
+            for fact in facts_text.split(";"):
+                key, _, value = partition(fact, "=")
+                facts[key.lower()] = value
+            ftype = facts.get("type", "").lower()
+            if ftype in ("cdir", "pdir") or name in (".", ".."):
+                continue
+            size = facts.get("size", "")
+            append((name, "dir" if ftype == "dir" else "file",
+                    int(size) if size.isdigit() else None))
+        return entries
+
+    def _data_lines(self, cmd: bytes) -> List[str]:
+        """Run a listing command and return the non-empty lines it sent."""
+        data_sock = self._transfer_cmd(cmd)
+
+        with data_sock, data_sock.makefile("rb", buffering=1 << 16) as data_file:
+            lines = [raw.rstrip(b"\r\n").decode("utf-8", errors="ignore")
+                     for raw in data_file if raw.strip()]
+
+        code2, text2 = self._read_response()
+        if code2 not in (226, 250):
+            name = cmd.split()[0]
+            raise FTPProtocolError(f"{name} did not complete correctly: {code2} {text2}")
+        return lines
+
+    def retr_binary(self, filename: str, callback: Callable[[memoryview], None],
+                    blocksize: int = BLOCK_SIZE, rest: Optional[int] = None) -> None:
+        """Download a file and pass each data chunk to callback(chunk).
+
+        Chunks are received with recv_into() into one reused buffer of
+        `blocksize` bytes, and `chunk` is a memoryview of it. It is only
+        valid during the call: f.write / bytearray.extend work directly,
+        but a callback that keeps chunks must copy them with bytes(chunk).
+        If `rest` is given, the transfer starts at that byte offset (REST).
+        """
+        data_sock = self._transfer_cmd(b"RETR " + filename.encode(self.encoding), rest=rest)
 
-        lines: List[str] = []
+        view = memoryview(bytearray(blocksize))
         with data_sock:
-            buffer = b""
             while True:
-                chunk = data_sock.recv(4096)
-                if not chunk:
+                n = data_sock.recv_into(view)
+                if not n:
                     break
-                buffer += chunk
-            text_data = buffer.decode("utf-8", errors="ignore")
-            for line in text_data.splitlines():
-                if line.strip():
-                    lines.append(line.rstrip("\r\n"))
+                callback(view[:n])
 
         code2, text2 = self._read_response()
         if code2 not in (226, 250):
-            raise FTPProtocolError(f"LIST did not complete correctly: {code2} {text2}")
-        return lines
+            raise FTPProtocolError(f"RETR did not complete correctly: {code2} {text2}")
 
-    def retr_binary(self, filename: str, callback: Callable[[bytes], None]) -> None:
-        """Download a file and pass each data chunk to callback(chunk: bytes)."""
-        self._send_cmd("TYPE I")
-        data_sock = self._enter_passive_mode()
-        code, text = self._send_cmd(f"RETR {filename}")
-        if code not in (125, 150):
-            data_sock.close()
-            raise FTPProtocolError(f"RETR failed: {code} {text}")
+    def retr_to_fd(self, filename: str, fd: int, blocksize: int = BLOCK_SIZE,
+                   rest: Optional[int] = None,
+                   progress: Optional[Callable[[int], None]] = None) -> None:
+        """Download a file straight into an OS file descriptor.
+
+        Data is received with recv_into() into one preallocated buffer and
+        written with os.write(), so no bytes object is created per chunk.
+        (Linux os.sendfile() cannot read from a socket, so a kernel-only
+        socket-to-file copy is not available here.)
+
+        If `rest` is given, the download starts at that byte offset (REST);
+        fd should then be positioned there, e.g. to resume a partial file.
+        If `progress` is given, progress(n) is called after each n bytes written.
+        """
+        data_sock = self._transfer_cmd(b"RETR " + filename.encode(self.encoding), rest=rest)
 
+        view = memoryview(bytearray(blocksize))
         with data_sock:
             while True:
-                buf = data_sock.recv(4096)
-                if not buf:
+                n = data_sock.recv_into(view)
+                if not n:
                     break
-                callback(buf)
+                chunk = view[:n]
+                while chunk:
+                    chunk = chunk[os.write(fd, chunk):]
+                if progress is not None:
+                    progress(n)
 
         code2, text2 = self._read_response()
         if code2 not in (226, 250):
             raise FTPProtocolError(f"RETR did not complete correctly: {code2} {text2}")
 
-    def stor_binary(self, filename: str, fileobj: BinaryIO) -> None:
-        """Upload a file to the server from a binary file-like object."""
-        self._send_cmd("TYPE I")
-        data_sock = self._enter_passive_mode()
-        code, text = self._send_cmd(f"STOR {filename}")
-        if code not in (125, 150):
-            data_sock.close()
-            raise FTPProtocolError(f"STOR failed: {code} {text}")
+    def retr_range(self, filename: str, fd: int, offset: int, length: int,
+                   blocksize: int = BLOCK_SIZE,
+                   progress: Optional[Callable[[int], None]] = None) -> None:
+        """Download bytes [offset, offset + length) of a file into fd.
 
+        Uses REST + RETR and writes with os.pwrite() at the same offsets, so
+        several connections can fill disjoint ranges of one local file in
+        parallel. The data connection is closed once `length` bytes have
+        arrived; the server may then answer 426 instead of 226.
+        If `progress` is given, progress(n) is called after each n bytes written.
+        """
+        data_sock = self._transfer_cmd(b"RETR " + filename.encode(self.encoding), rest=offset)
+
+        pos = offset
+        end = offset + length
+        view = memoryview(bytearray(min(blocksize, length)))
         with data_sock:
-            while True:
-                buf = fileobj.read(4096)
-                if not buf:
+            while pos < end:
+                n = data_sock.recv_into(view, min(len(view), end - pos))
+                if not n:
                     break
-                data_sock.sendall(buf)
+                chunk = view[:n]
+                while chunk:
+                    written = os.pwrite(fd, chunk, pos)
+                    chunk = chunk[written:]
+                    pos += written
+                if progress is not None:
+                    progress(n)
+
+        code2, text2 = self._read_response()
+        if pos < end:
+            raise FTPProtocolError(f"RETR ended early at byte {pos} of {end}: {code2} {text2}")
+        if code2 not in (226, 250, 426):
+            raise FTPProtocolError(f"RETR did not complete correctly: {code2} {text2}")
+
+    def stor_binary(self, filename: str, fileobj: BinaryIO,
+                    blocksize: int = BLOCK_SIZE) -> None:
+        """Upload a file to the server from a binary file-like object.
+
+        Regular files are sent with socket.sendfile(), which uses the
+        zero-copy os.sendfile() where available. Other file-like objects
+        (e.g. BytesIO) are read with readinto() into one reused buffer of
+        `blocksize` bytes and sent from a memoryview of it, so no new bytes
+        object is allocated per chunk.
+        """
+        data_sock = self._transfer_cmd(b"STOR " + filename.encode(self.encoding))
+
+        with data_sock:
+            if _has_fileno(fileobj):
+                # Real file: let the kernel copy file -> socket (os.sendfile)
+                data_sock.sendfile(fileobj)
+            else:
+                buf = bytearray(blocksize)
+                view = memoryview(buf)
+                while True:
+                    n = fileobj.readinto(buf)
+                    if not n:
+                        break
+                    data_sock.sendall(view[:n])
+            if isinstance(data_sock, ssl.SSLSocket):
+                # Send TLS close_notify so the server knows the upload is complete
+                data_sock.unwrap()
 
         code2, text2 = self._read_response()
         if code2 not in (226, 250):
             raise FTPProtocolError(f"STOR did not complete correctly: {code2} {text2}")
+
+
+class FTPConnectionPool:
+    """A small pool of extra logged-in FTPConnection objects.
+
+    Used for work that runs in parallel with the main connection, e.g.
+    ranged downloads. Connections are opened on first use (up to `size`)
+    and then kept open, so later operations skip the TCP handshake and
+    login. Each connection has its own working directory, so callers
+    should pass absolute paths.
+
+    Usage:
+        with pool.borrow() as conn:
+            conn.retr_range("/dir/file", fd, 0, 1024)
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str,
+                 size: int = 4, timeout: int = 10,
+                 context: Optional[ssl.SSLContext] = None) -> None:
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.context = context
+        # Applied to each new connection (e.g. from autotune_buffers())
+        self.data_bufsize: int = DATA_SOCKET_BUFFER
+        self._idle: "queue.LifoQueue[FTPConnection]" = queue.LifoQueue()
+        # Connections checked out by borrow(), so close() can abort them
+        self._busy: Set[FTPConnection] = set()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+
+    def _open(self) -> FTPConnection:
+        conn = FTPConnection(self.context)
+        conn.data_bufsize = self.data_bufsize
+        try:
+            conn.connect(self.host, self.port, timeout=self.timeout)
+            conn.login(user=self.user, password=self.password)
+        except Exception:
+            conn.quit()
+            raise
+        return conn
+
+    def _acquire(self) -> FTPConnection:
+        conn = self._take()
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._busy.add(conn)
+        if closed:
+            # close() ran while this one was being opened or waited for
+            self._release(conn, False)
+            raise FTPProtocolError("Connection pool is closed")
+        return conn
+
+    def _take(self) -> FTPConnection:
+        """Return an idle connection, a new one if below size, or wait for one."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise FTPProtocolError("Connection pool is closed")
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                break
+            # All connections are busy: wait for one to be returned. Wake up
+            # now and then, since close() or a connection dropped as broken
+            # returns nothing to the queue
+            try:
+                return self._idle.get(timeout=POOL_WAIT_POLL)
+            except queue.Empty:
+                pass
+        try:
+            return self._open()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def _release(self, conn: FTPConnection, healthy: bool) -> None:
+        with self._lock:
+            self._busy.discard(conn)
+            keep = healthy and not self._closed
+            if not keep:
+                self._opened -= 1
+        if keep:
+            self._idle.put(conn)
+        else:
+            conn.quit()
+
+    @contextmanager
+    def borrow(self) -> Iterator[FTPConnection]:
+        """Check out a connection; it is returned to the pool afterwards.
+
+        If the body raises, the connection is closed instead of reused,
+        since its control channel may be out of sync.
+        """
+        conn = self._acquire()
+        healthy = False
+        try:
+            yield conn
+            healthy = True
+        finally:
+            self._release(conn, healthy)
+
+    def close(self) -> None:
+        """Close idle connections and abort busy ones.
+
+        Transfers on borrowed connections fail promptly; those connections
+        are closed when returned.
+        """
+        with self._lock:
+            self._closed = True
+            busy = list(self._busy)
+        for conn in busy:
+            conn.abort()
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
+            conn.quit()
@@ -15,9 +15,16 @@ needs:
 - RNFR / RNTO       : rename
 - TYPE I            : set binary mode (accepted but only one mode)
 - PASV              : enter passive mode (server opens data port)
+- EPSV              : extended passive mode (RFC 2428, port only)
 - LIST              : list directory over data connection
+- MLSD              : machine-readable directory listing (RFC 3659)
+- MLST              : machine-readable facts of a single path (RFC 3659)
+- FEAT              : list supported extensions
 - RETR              : download file
 - STOR              : upload file
+- SIZE              : size of a file in bytes
+- REST              : restart offset for the next RETR/STOR
+- NOOP              : no operation (keep-alive / round-trip probe)
 - QUIT              : close session
 
 It supports a very simple user database with per-user permissions
@@ -29,12 +36,248 @@ DO NOT expose it to the Internet in production.
 
 from __future__ import annotations
 
+import errno
+import functools
+import logging
 import os
+import queue
+import select
+import selectors
 import socket
-import threading
-import traceback
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Tuple, Optional
+from typing import BinaryIO, Callable, Dict, List, Tuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# Receive buffer size for uploads, and read size when RETR cannot use sendfile()
+BLOCK_SIZE = 1 << 20
+# Kernel socket buffer size for data connections (SO_SNDBUF/SO_RCVBUF)
+DATA_SOCKET_BUFFER = 4 << 20
+# Seconds a data connection may wait to be opened or make no progress, and a
+# reply may wait for the client to read; keeps a stalled client from holding
+# one of the MAX_WORKERS threads for good
+DATA_TIMEOUT = 30.0
+# recv_into() size for the control connection, and the longest command line
+CONTROL_BUFFER = 4096
+MAX_LINE = 8192
+# Threads running session commands; idle sessions do not occupy one
+MAX_WORKERS = 64
+# How much of a file RETR asks the kernel to start reading up front
+WILLNEED_WINDOW = 8 << 20
+# Buffers per sendmsg() call (the kernel's limit; 1024 on Linux)
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+# Directory listing lines, filled in with bytes names (and sizes)
+_LIST_DIR_LINE = b"drwxr-xr-x 1 owner group 0 Jan 01 00:00 %s\r\n"
+_LIST_FILE_LINE = b"-rw-r--r-- 1 owner group %d Jan 01 00:00 %s\r\n"
+_MLSD_DIR_LINE = b"type=dir; %s\r\n"
+_MLSD_FILE_LINE = b"type=file;size=%d; %s\r\n"
+_MLSD_NOSIZE_LINE = b"type=file; %s\r\n"
+# os.sendfile() errors meaning "not for this file/socket pair", not a failure
+_SENDFILE_UNSUPPORTED = {errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP}
+
+
+def _wait_writable(sock: socket.socket) -> None:
+    """Wait until sock can take more data; TimeoutError after its timeout.
+
+    For the os.sendfile()/os.splice() calls below: a socket with a timeout
+    is non-blocking underneath, so they fail with EAGAIN when it is full.
+    """
+    timeout = sock.gettimeout()
+    if hasattr(select, "poll"):
+        poller = select.poll()
+        poller.register(sock, select.POLLOUT)
+        ready = poller.poll(None if timeout is None else timeout * 1000)
+    else:
+        ready = select.select([], [sock], [], timeout)[1]
+    if not ready:
+        raise TimeoutError("timed out")
+
+
+def _send_file(sock: socket.socket, f: BinaryIO, offset: int = 0) -> None:
+    """Send the file f from offset to its end over sock.
+
+    Uses os.sendfile(), so the kernel moves pages from the page cache to
+    the socket without copying them through Python. Where os.sendfile()
+    does not exist, or refuses this file/socket pair before anything was
+    sent, the data goes file -> pipe -> socket with os.splice(), which
+    also stays in the kernel; failing that, through a BLOCK_SIZE
+    read/sendall loop.
+
+    Where available, posix_fadvise() asks for sequential readahead before
+    the transfer and drops the pages that were sent afterwards, so large
+    downloads do not push everything else out of the page cache.
+    """
+    in_fd = f.fileno()
+    size = os.fstat(in_fd).st_size
+    start = pos = offset
+    advise = getattr(os, "posix_fadvise", None)
+    if advise is not None and start < size:
+        advise(in_fd, start, size - start, os.POSIX_FADV_SEQUENTIAL)
+        # Start reading only the first window now; readahead does the rest
+        advise(in_fd, start, min(size - start, WILLNEED_WINDOW), os.POSIX_FADV_WILLNEED)
+    try:
+        sendfile = getattr(os, "sendfile", None)
+        if sendfile is not None:
+            out_fd = sock.fileno()
+            try:
+                while pos < size:
+                    try:
+                        sent = sendfile(out_fd, in_fd, pos, size - pos)
+                    except BlockingIOError:
+                        _wait_writable(sock)
+                        continue
+                    if not sent:
+                        return  # the file was truncated while we sent it
+                    pos += sent
+                return
+            except OSError as e:
+                if e.errno not in _SENDFILE_UNSUPPORTED or pos != start:
+                    raise
+        splice = getattr(os, "splice", None)
+        if splice is not None:
+            out_fd = sock.fileno()
+            pipe_r, pipe_w = os.pipe()
+            try:
+                if fcntl is not None and hasattr(fcntl, "F_SETPIPE_SZ"):
+                    try:
+                        fcntl.fcntl(pipe_w, fcntl.F_SETPIPE_SZ, BLOCK_SIZE)
+                    except OSError:
+                        pass  # above pipe-max-size; the default size works
+                while pos < size:
+                    n = splice(in_fd, pipe_w, size - pos, offset_src=pos)
+                    if not n:
+                        return  # the file was truncated while we sent it
+                    left = n
+                    while left:
+                        try:
+                            left -= splice(pipe_r, out_fd, left)
+                        except BlockingIOError:
+                            _wait_writable(sock)
+                    pos += n
+                return
+            except OSError as e:
+                if e.errno not in _SENDFILE_UNSUPPORTED or pos != start:
+                    raise
+            finally:
+                os.close(pipe_r)
+                os.close(pipe_w)
+        view = memoryview(bytearray(BLOCK_SIZE))
+        f.seek(pos)
+        while True:
+            n = f.readinto(view)
+            if not n:
+                return
+            sock.sendall(view[:n])
+            pos += n
+    finally:
+        # Only the range actually sent: a ranged download closes early, and
+        # the rest of the file may be in use by the other parts
+        if advise is not None and pos > start:
+            advise(in_fd, start, pos - start, os.POSIX_FADV_DONTNEED)
+
+
+def _send_chunks(sock: socket.socket, chunks: List[bytes]) -> None:
+    """Send chunks in order, gathering up to IOV_MAX of them per sendmsg().
+
+    Avoids joining a large listing into one bytes object first. Falls back
+    to a joined sendall() where sendmsg() is not available.
+    """
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(chunks))
+        return
+    i, count = 0, len(chunks)
+    while i < count:
+        batch = chunks[i:i + IOV_MAX]
+        sent = sock.sendmsg(batch)
+        # Skip the chunks sent in full; keep the unsent tail of a partial one
+        for chunk in batch:
+            n = len(chunk)
+            if sent < n:
+                if sent:
+                    chunks[i] = memoryview(chunk)[sent:]
+                break
+            sent -= n
+            i += 1
+
+
+def _list_line(name: bytes, is_dir: bool, size: Optional[int]) -> bytes:
+    """One LIST entry; size is None when it could not be read."""
+    if is_dir:
+        return _LIST_DIR_LINE % name
+    return _LIST_FILE_LINE % (size or 0, name)
+
+
+def _mlsd_line(name: bytes, is_dir: bool, size: Optional[int]) -> bytes:
+    """One MLSD/MLST entry; the size fact is left out when unknown."""
+    if is_dir:
+        return _MLSD_DIR_LINE % name
+    if size is None:
+        return _MLSD_NOSIZE_LINE % name
+    return _MLSD_FILE_LINE % (size, name)
+
+
+def _trace() -> bool:
+    """exc_info for logging calls: walk the traceback only when debugging."""
+    return log.isEnabledFor(logging.DEBUG)
+
+
+def requires_login(fn: Callable) -> Callable:
+    """Mark a command handler as needing a logged-in user (530 otherwise).
+
+    FTPSession.dispatch() checks the mark before calling the handler.
+    """
+    fn.needs_login = True
+    return fn
+
+
+def requires_write(fn: Callable) -> Callable:
+    """Mark a command handler as needing a logged-in user with write permission."""
+    fn.needs_login = True
+    fn.needs_write = True
+    return fn
+
+
+@functools.lru_cache(maxsize=1024)
+def _to_real(root: str, root_prefix: str, cwd: str, path: str) -> str:
+    """Map an FTP path, relative to cwd, to a path under root, lexically.
+
+    root_prefix is root with a trailing separator. A pure function of its
+    arguments, so results are cached and shared by all sessions; symlinks
+    are checked separately by _inside_root(), which is not cached.
+    """
+    # Normalize: if path is relative, join with cwd
+    if not path.startswith("/"):
+        path = os.path.join(cwd, path)
+    # Collapse .. and . (a leading .. stops at "/", i.e. at the root)
+    norm = os.path.normpath(path).lstrip("/")
+    if not norm:
+        return root
+    # The root is absolute and norm is normalized, so no abspath() needed
+    return root_prefix + norm
+
+
+def _inside_root(real: str, root: str) -> bool:
+    """Whether real still lies under root once symlinks are resolved.
+
+    root must already be resolved with os.path.realpath(). Not cached: a
+    symlink can be created or changed at any time, so the answer depends
+    on the filesystem at the moment of the command.
+    """
+    try:
+        return os.path.commonpath((os.path.realpath(real), root)) == root
+    except (ValueError, OSError):
+        return False
 
 
 @dataclass
@@ -68,8 +311,15 @@ class FTPSession:
         self.conn = conn
         self.addr = addr
         self.config = config
-
-        self.control_file = conn.makefile("rwb")  # for readline/write
+        # Resolved FTP root without a trailing separator, and with one, for to_real_path()
+        self._root = os.path.realpath(config.root)
+        self._root_prefix = os.path.join(self._root, "")
+
+        # Control connection input: received bytes not yet returned as a
+        # command, and how far they have already been searched for b"\n"
+        self._recv_buf = bytearray()
+        self._scan_from = 0
+        self._recv_chunk = memoryview(bytearray(CONTROL_BUFFER))
         self.logged_in = False
         self.username: Optional[str] = None
         self.cwd = "/"  # current working directory, relative to FTP root, always like '/subdir'
@@ -77,23 +327,82 @@ class FTPSession:
 
         # Passive mode data listener (per command)
         self.pasv_listener: Optional[socket.socket] = None
+        self._pasv_addr: Optional[Tuple[str, int]] = None
+        # True from PASV/EPSV until a data connection is accepted on it
+        self._pasv_pending = False
+        # Byte offset set by REST, consumed by the next RETR/STOR
+        self.rest_offset = 0
+        # STOR receive buffer, allocated by the first upload and then reused
+        self._io_view: Optional[memoryview] = None
 
     # ---------- Utility helpers ----------
+    def _send_bytes(self, data: bytes) -> None:
+        try:
+            self.conn.sendall(data)
+        except TimeoutError:
+            # The client stopped reading replies. The rest of this reply is
+            # lost, so end the session; shutting the socket down makes any
+            # further reply from the running handler fail at once too.
+            log.info("[CTRL] %s not reading replies for %ss, closing", self.addr, DATA_TIMEOUT)
+            try:
+                self.conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            raise
+
     def _send_line(self, line: str) -> None:
         # All replies must end with CRLF
-        data = (line + "\r\n").encode("utf-8")
-        self.control_file.write(data)
-        self.control_file.flush()
+        self._send_bytes((line + "\r\n").encode("utf-8"))
 
     def reply(self, code: int, text: str) -> None:
         self._send_line(f"{code} {text}")
 
-    def read_command(self) -> Optional[str]:
-        line = self.control_file.readline()
-        if not line:
+    def _pop_line(self) -> Optional[str]:
+        """Take the next complete line out of _recv_buf, or return None."""
+        buf = self._recv_buf
+        # Only bytes that arrived since the last search need scanning
+        end = buf.find(b"\n", self._scan_from)
+        if end < 0:
+            self._scan_from = len(buf)
             return None
+        line = bytes(buf[:end + 1])
+        del buf[:end + 1]
+        self._scan_from = 0
         return line.decode("utf-8", errors="ignore").rstrip("\r\n")
 
+    def _recv_more(self) -> bool:
+        """Append the next chunk from the client to _recv_buf.
+
+        Returns False once the client has closed the connection (after
+        turning any unterminated last line into a complete one, as
+        readline() would return it) or has sent a line over MAX_LINE.
+        """
+        buf = self._recv_buf
+        if len(buf) > MAX_LINE:
+            log.warning("[CTRL] command line too long from %s", self.addr)
+            return False
+        n = self.conn.recv_into(self._recv_chunk)
+        if not n:
+            if buf:
+                buf += b"\n"
+            return False
+        buf += self._recv_chunk[:n]
+        return True
+
+    def handle_readable(self) -> bool:
+        """Receive what the client sent and run every complete command in it.
+
+        Used by FTPServer when the control socket is readable, so a single
+        recv() never blocks. Returns False when the session is over.
+        """
+        alive = self._recv_more()
+        while True:
+            cmdline = self._pop_line()
+            if cmdline is None:
+                return alive
+            if not self.dispatch(cmdline):
+                return False
+
     def user_perm(self) -> str:
         if not self.logged_in or self.username is None:
             return ""
@@ -109,17 +418,12 @@ class FTPSession:
 
     # Map FTP virtual path (starting with /) to real filesystem path
     def to_real_path(self, path: str) -> str:
-        # Normalize: if path is relative, join with cwd
-        if not path.startswith("/"):
-            path = os.path.join(self.cwd, path)
-        # Collapse .. and .
-        norm = os.path.normpath(path)
-        if not norm.startswith("/"):
-            norm = "/" + norm
-        real = os.path.abspath(os.path.join(self.config.root, norm.lstrip("/")))
-        # Ensure we stay under root
-        if not real.startswith(self.config.root):
-            return self.config.root
+        real = _to_real(self._root, self._root_prefix, self.cwd, path)
+        # Stay under root, also through symlinks inside it. The path itself
+        # is returned unresolved, so DELE or RNFR act on a link, not on its
+        # target.
+        if real != self._root and not _inside_root(real, self._root):
+            return self._root
         return real
 
     # ---------- Command handlers ----------
@@ -142,23 +446,19 @@ class FTPSession:
             self.logged_in = False
             self.reply(530, "Login incorrect.")
 
+    @requires_login
     def handle_PWD(self) -> None:
-        if not self.logged_in:
-            self.reply(530, "Please login with USER and PASS.")
-            return
         # Reply format: 257 "/" is current directory
         self.reply(257, f'"{self.cwd}" is current directory')
 
+    @requires_login
     def handle_CWD(self, arg: str) -> None:
-        if not self.logged_in:
-            self.reply(530, "Please login with USER and PASS.")
-            return
         if not arg:
             arg = "/"
         new_real = self.to_real_path(arg)
         if os.path.isdir(new_real):
             # Convert back to virtual path rooted at '/'
-            rel = os.path.relpath(new_real, self.config.root)
+            rel = os.path.relpath(new_real, self._root)
             self.cwd = "/" if rel == "." else "/" + rel.replace(os.sep, "/")
             self.reply(250, "Directory successfully changed.")
         else:
@@ -170,32 +470,78 @@ class FTPSession:
         self.reply(200, f"Type set to {self.type}.")
 
     # ---- Passive mode ----
-    def handle_PASV(self) -> None:
-        # Close any previous listener
-        if self.pasv_listener is not None:
-            try:
-                self.pasv_listener.close()
-            except Exception:
-                pass
-            self.pasv_listener = None
+    def _open_pasv_listener(self) -> Optional[Tuple[str, int]]:
+        """Return the passive listener's (host, port), or None after replying 421.
+
+        The listener stays open between transfers and is offered again, so
+        a client making many transfers costs one bind/listen, not one each.
+        It is only replaced if the previous offer was never used: a client
+        may still have a connection queued on it for a command that failed
+        before accepting, which must not be taken for the next transfer.
+        Connections that arrived while no offer was open are dropped before
+        the port is offered again.
+        """
+        if self.pasv_listener is not None and not self._pasv_pending:
+            self._drop_queued_connections()
+            self._pasv_pending = True
+            return self._pasv_addr
+        self._close_pasv_listener()
 
         # Bind to an ephemeral port on the same host as control connection
         host = self.config.host if self.config.host != "0.0.0.0" else self.conn.getsockname()[0]
         self.pasv_listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.pasv_listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Set before listen() so accepted connections inherit the buffers and
+        # negotiate a large enough window scale in the handshake
+        self.pasv_listener.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, DATA_SOCKET_BUFFER)
+        self.pasv_listener.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, DATA_SOCKET_BUFFER)
         try:
             self.pasv_listener.bind((host, 0))
         except Exception as e:
-            print(f"[PASV] bind error on {host}: {e}")
-            traceback.print_exc()
+            log.error("[PASV] bind error on %s: %s", host, e, exc_info=_trace())
+            self._close_pasv_listener()
             self.reply(421, "Cannot open passive listener")
-            return
+            return None
         self.pasv_listener.listen(1)
+        self.pasv_listener.settimeout(DATA_TIMEOUT)
 
         # Debug output
         port = self.pasv_listener.getsockname()[1]
-        print(f"[PASV] listening on {host}:{port}")
+        log.debug("[PASV] listening on %s:%d", host, port)
+        self._pasv_addr = (host, port)
+        self._pasv_pending = True
+        return host, port
+
+    def _drop_queued_connections(self) -> None:
+        """Close every connection already waiting on the idle listener."""
+        listener = self.pasv_listener
+        timeout = listener.gettimeout()
+        listener.setblocking(False)
+        try:
+            while True:
+                try:
+                    stray, peer = listener.accept()
+                except (BlockingIOError, InterruptedError):
+                    break
+                log.warning("[PASV] dropping connection from %s made with no PASV pending", peer)
+                stray.close()
+        finally:
+            listener.settimeout(timeout)
 
+    def _close_pasv_listener(self) -> None:
+        if self.pasv_listener is not None:
+            try:
+                self.pasv_listener.close()
+            except Exception:
+                pass
+            self.pasv_listener = None
+        self._pasv_pending = False
+
+    def handle_PASV(self) -> None:
+        addr = self._open_pasv_listener()
+        if addr is None:
+            return
+        host, port = addr
         try:
             h1, h2, h3, h4 = host.split(".")
         except Exception:
@@ -206,73 +552,144 @@ class FTPSession:
         p2 = port % 256
         self.reply(227, f"Entering Passive Mode ({h1},{h2},{h3},{h4},{p1},{p2}).")
 
+    def handle_EPSV(self) -> None:
+        # Like PASV, but only the port is sent; the client reuses the control host
+        addr = self._open_pasv_listener()
+        if addr is None:
+            return
+        self.reply(229, f"Entering Extended Passive Mode (|||{addr[1]}|)")
+
     def accept_data_connection(self) -> Optional[socket.socket]:
-        if self.pasv_listener is None:
+        if self.pasv_listener is None or not self._pasv_pending:
             self.reply(425, "Use PASV first.")
             return None
+        client_ip = self.conn.getpeername()[0]
         try:
-            print("[PASV] waiting for data connection...")
-            data_conn, peer = self.pasv_listener.accept()
-            print(f"[PASV] data connection accepted from {peer}")
-            return data_conn
+            log.debug("[PASV] waiting for data connection...")
+            while True:
+                data_conn, peer = self.pasv_listener.accept()
+                # The port is public: only the control connection's host may
+                # take the data for this session
+                if peer[0] == client_ip:
+                    break
+                log.warning("[PASV] rejecting data connection from %s, expected %s",
+                            peer, client_ip)
+                data_conn.close()
+            # Don't hold back the last partial segment of a LIST or RETR
+            data_conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            data_conn.settimeout(DATA_TIMEOUT)
+            log.debug("[PASV] data connection accepted from %s", peer)
         except Exception as e:
-            print(f"[PASV] accept failed: {e}")
-            traceback.print_exc()
+            log.warning("[PASV] accept failed: %s", e, exc_info=_trace())
+            self._close_pasv_listener()
             self.reply(425, "Can't open data connection.")
             return None
-        finally:
-            try:
-                self.pasv_listener.close()
-            except Exception:
-                pass
-            self.pasv_listener = None
-
-    # ---- LIST ----
-    def handle_LIST(self, arg: str) -> None:
-        if not self.logged_in:
-            self.reply(530, "Please login with USER and PASS.")
-            return
+        # Keep the listener for the next PASV/EPSV
+        self._pasv_pending = False
+        return data_conn
+
+    # ---- LIST / MLSD / MLST ----
+    def _send_listing(self, command: str, real_dir: str,
+                      format_line: Callable[[bytes, bool, Optional[int]], bytes]) -> None:
+        """Send one format_line() entry per item of real_dir over a data connection."""
         data_conn = self.accept_data_connection()
         if data_conn is None:
             return
 
         self.reply(150, "Here comes the directory listing.")
-        real_dir = self.to_real_path(arg or self.cwd)
+        lines = []
         try:
-            entries = os.listdir(real_dir)
+            # is_dir() comes from the directory read itself, so only files
+            # need a stat() call (for their size). Scanning a bytes path
+            # gives bytes names, which go into the lines without decoding.
+            with os.scandir(os.fsencode(real_dir)) as it:
+                for entry in it:
+                    name = entry.name
+                    try:
+                        if entry.is_dir():
+                            line = format_line(name, True, None)
+                        else:
+                            line = format_line(name, False, entry.stat().st_size)
+                    except Exception as e:
+                        # Can fire for every entry of a large directory
+                        if log.isEnabledFor(logging.DEBUG):
+                            log.debug("[%s] stat error for %r: %s", command, entry.path, e, exc_info=True)
+                        line = format_line(name, False, None)
+                    lines.append(line)
         except Exception as e:
-            print(f"[LIST] os.listdir error for {real_dir}: {e}")
-            traceback.print_exc()
-            entries = []
+            log.warning("[%s] os.scandir error for %s: %s", command, real_dir, e, exc_info=_trace())
 
         with data_conn:
-            for name in entries:
-                full = os.path.join(real_dir, name)
-                try:
-                    st = os.stat(full)
-                    size = st.st_size
-                    if os.path.isdir(full):
-                        line = f"drwxr-xr-x 1 owner group 0 Jan 01 00:00 {name}\r\n"
-                    else:
-                        line = f"-rw-r--r-- 1 owner group {size} Jan 01 00:00 {name}\r\n"
-                except Exception as e:
-                    print(f"[LIST] stat error for {full}: {e}")
-                    traceback.print_exc()
-                    line = f"-rw-r--r-- 1 owner group 0 Jan 01 00:00 {name}\r\n"
-                try:
-                    data_conn.sendall(line.encode("utf-8"))
-                except Exception as e:
-                    print(f"[LIST] sendall error: {e}")
-                    traceback.print_exc()
-                    break
+            # Send the whole listing at once rather than one entry per send
+            try:
+                _send_chunks(data_conn, lines)
+            except Exception as e:
+                log.warning("[%s] send error: %s", command, e, exc_info=_trace())
+                self.reply(426, "Data connection failed; listing aborted.")
+                return
 
         self.reply(226, "Directory send OK.")
 
+    @requires_login
+    def handle_LIST(self, arg: str) -> None:
+        self._send_listing("LIST", self.to_real_path(arg or self.cwd), _list_line)
+
+    @requires_login
+    def handle_MLSD(self, arg: str) -> None:
+        real_dir = self.to_real_path(arg or self.cwd)
+        if not os.path.isdir(real_dir):
+            self.reply(501, "Not a directory.")
+            return
+        self._send_listing("MLSD", real_dir, _mlsd_line)
+
+    @requires_login
+    def handle_MLST(self, arg: str) -> None:
+        # Facts go on the control connection, formatted like an MLSD entry
+        path = arg or self.cwd
+        real_path = self.to_real_path(path)
+        try:
+            if os.path.isdir(real_path):
+                entry = _mlsd_line(path.encode("utf-8"), True, None)
+            else:
+                entry = _mlsd_line(path.encode("utf-8"), False, os.stat(real_path).st_size)
+        except OSError:
+            self.reply(550, "No such file or directory.")
+            return
+        self._send_line(f"250-Listing {path}")
+        self._send_bytes(b" " + entry)
+        self.reply(250, "End")
+
+    def handle_FEAT(self) -> None:
+        self._send_line("211-Features:")
+        for feature in ("EPSV", "MLST type*;size*;", "SIZE", "REST STREAM"):
+            self._send_line(f" {feature}")
+        self.reply(211, "End")
+
+    # ---- SIZE / REST ----
+    @requires_login
+    def handle_SIZE(self, arg: str) -> None:
+        real_path = self.to_real_path(arg)
+        if not os.path.isfile(real_path):
+            self.reply(550, "Could not get file size.")
+            return
+        self.reply(213, str(os.path.getsize(real_path)))
+
+    @requires_login
+    def handle_REST(self, arg: str) -> None:
+        try:
+            offset = int(arg)
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            self.reply(501, "Invalid restart position.")
+            return
+        self.rest_offset = offset
+        self.reply(350, f"Restarting at {offset}. Send STORE or RETRIEVE.")
+
     # ---- RETR ----
+    @requires_login
     def handle_RETR(self, arg: str) -> None:
-        if not self.logged_in:
-            self.reply(530, "Please login with USER and PASS.")
-            return
+        offset, self.rest_offset = self.rest_offset, 0
         real_path = self.to_real_path(arg)
         if not os.path.isfile(real_path):
             self.reply(550, "File not found.")
@@ -284,26 +701,27 @@ class FTPSession:
 
         self.reply(150, "Opening binary mode data connection.")
         try:
-            print(f"[RETR] sending file {real_path}")
-            with data_conn, open(real_path, "rb") as f:
-                while True:
-                    buf = f.read(4096)
-                    if not buf:
-                        break
-                    data_conn.sendall(buf)
+            log.debug("[RETR] sending file %s from offset %d", real_path, offset)
+            # Unbuffered: sendfile() reads the file itself, so a Python-level
+            # buffer would only be allocated and never used
+            with data_conn, open(real_path, "rb", buffering=0) as f:
+                _send_file(data_conn, f, offset)
             self.reply(226, "Transfer complete.")
+        except ConnectionError as e:
+            # Client closed the data connection early (e.g. a ranged download)
+            log.debug("[RETR] data connection closed by client: %s", e)
+            self.reply(426, "Connection closed; transfer aborted.")
+        except TimeoutError:
+            log.warning("[RETR] data connection stalled for %ss: %s", DATA_TIMEOUT, real_path)
+            self.reply(426, "Data connection timed out; transfer aborted.")
         except Exception as e:
-            print(f"[RETR] error transferring {real_path}: {e}")
-            traceback.print_exc()
+            log.error("[RETR] error transferring %s: %s", real_path, e, exc_info=_trace())
             self.reply(550, "Failed to read file.")
 
     # ---- STOR ----
+    @requires_write
     def handle_STOR(self, arg: str) -> None:
-        if not self.logged_in:
-            self.reply(530, "Please login with USER and PASS.")
-            return
-        if not self.ensure_write_perm():
-            return
+        offset, self.rest_offset = self.rest_offset, 0
         real_path = self.to_real_path(arg)
         os.makedirs(os.path.dirname(real_path), exist_ok=True)
 
@@ -313,27 +731,35 @@ class FTPSession:
 
         self.reply(150, "Opening binary mode data connection for file upload.")
         try:
-            print(f"[STOR] receiving file -> {real_path}")
-            print(f"[STOR] write access to dir? {os.access(os.path.dirname(real_path), os.W_OK)}")
-            with data_conn, open(real_path, "wb") as f:
+            log.debug("[STOR] receiving file -> %s", real_path)
+            # With REST, keep the first `offset` bytes and overwrite the rest
+            mode = "r+b" if offset and os.path.isfile(real_path) else "wb"
+            # Filled in place by recv_into() and written straight to an
+            # unbuffered file (raw writes may be partial)
+            view = self._io_view
+            if view is None:
+                view = self._io_view = memoryview(bytearray(BLOCK_SIZE))
+            with data_conn, open(real_path, mode, buffering=0) as f:
+                f.seek(offset)
+                f.truncate()
                 while True:
-                    buf = data_conn.recv(4096)
-                    if not buf:
+                    n = data_conn.recv_into(view)
+                    if not n:
                         break
-                    f.write(buf)
+                    done = 0
+                    while done < n:
+                        done += f.write(view[done:n])
             self.reply(226, "Transfer complete.")
+        except (ConnectionError, TimeoutError) as e:
+            log.warning("[STOR] data connection failed for %s: %s", real_path, e)
+            self.reply(426, "Data connection failed; transfer aborted.")
         except Exception as e:
-            print(f"[STOR] error storing {real_path}: {e}")
-            traceback.print_exc()
+            log.error("[STOR] error storing %s: %s", real_path, e, exc_info=_trace())
             self.reply(550, "Failed to store file.")
 
     # ---- MKD / RMD / DELE / RNFR / RNTO ----
+    @requires_write
     def handle_MKD(self, arg: str) -> None:
-        if not self.logged_in:
-            self.reply(530, "Please login with USER and PASS.")
-            return
-        if not self.ensure_write_perm():
-            return
         real_path = self.to_real_path(arg)
         try:
             os.makedirs(real_path, exist_ok=True)
@@ -341,12 +767,8 @@ class FTPSession:
         except Exception:
             self.reply(550, "Create directory failed.")
 
+    @requires_write
     def handle_RMD(self, arg: str) -> None:
-        if not self.logged_in:
-            self.reply(530, "Please login with USER and PASS.")
-            return
-        if not self.ensure_write_perm():
-            return
         real_path = self.to_real_path(arg)
         try:
             os.rmdir(real_path)
@@ -354,12 +776,8 @@ class FTPSession:
         except Exception:
             self.reply(550, "Remove directory failed.")
 
+    @requires_write
     def handle_DELE(self, arg: str) -> None:
-        if not self.logged_in:
-            self.reply(530, "Please login with USER and PASS.")
-            return
-        if not self.ensure_write_perm():
-            return
         real_path = self.to_real_path(arg)
         try:
             os.remove(real_path)
@@ -367,12 +785,8 @@ class FTPSession:
         except Exception:
             self.reply(550, "Delete failed.")
 
+    @requires_write
     def handle_RNFR(self, arg: str) -> None:
-        if not self.logged_in:
-            self.reply(530, "Please login with USER and PASS.")
-            return
-        if not self.ensure_write_perm():
-            return
         self._rename_from = self.to_real_path(arg)
         if not os.path.exists(self._rename_from):
             self.reply(550, "File not found.")
@@ -394,83 +808,173 @@ class FTPSession:
             self._rename_from = None
 
     # ---------- Main loop ----------
-    def serve(self) -> None:
+    def handle_NOOP(self) -> None:
+        self.reply(200, "NOOP ok.")
+
+    def handle_QUIT(self) -> bool:
+        self.reply(221, "Goodbye.")
+        return False
+
+    # Command name -> (handler, whether it takes the argument, needs login,
+    # needs write permission); the last two are read once from the marks
+    # left by @requires_login / @requires_write
+    _COMMANDS: Dict[str, Tuple[Callable[..., Optional[bool]], bool, bool, bool]] = {
+        name: (fn, takes_arg, getattr(fn, "needs_login", False), getattr(fn, "needs_write", False))
+        for name, (fn, takes_arg) in {
+            "USER": (handle_USER, True),
+            "PASS": (handle_PASS, True),
+            "PWD": (handle_PWD, False),
+            "CWD": (handle_CWD, True),
+            "TYPE": (handle_TYPE, True),
+            "PASV": (handle_PASV, False),
+            "EPSV": (handle_EPSV, False),
+            "LIST": (handle_LIST, True),
+            "MLSD": (handle_MLSD, True),
+            "MLST": (handle_MLST, True),
+            "FEAT": (handle_FEAT, False),
+            "RETR": (handle_RETR, True),
+            "STOR": (handle_STOR, True),
+            "SIZE": (handle_SIZE, True),
+            "REST": (handle_REST, True),
+            "MKD": (handle_MKD, True),
+            "RMD": (handle_RMD, True),
+            "DELE": (handle_DELE, True),
+            "RNFR": (handle_RNFR, True),
+            "RNTO": (handle_RNTO, True),
+            "NOOP": (handle_NOOP, False),
+            "QUIT": (handle_QUIT, False),
+        }.items()
+    }
+
+    def greet(self) -> None:
         # Send welcome banner
         self.reply(220, "Simple FTP Server Ready")
+
+    def dispatch(self, cmdline: str) -> bool:
+        """Run one command line; return False if the session should end."""
+        if not cmdline:
+            return True
+        if "\x00" in cmdline:
+            # No path or name can contain NUL, and os functions raise on it
+            self.reply(501, "Syntax error in parameters or arguments.")
+            return True
+        parts = cmdline.split(" ", 1)
+        command = parts[0].upper()
+        entry = self._COMMANDS.get(command)
+        if entry is None:
+            self.reply(502, "Command not implemented.")
+            return True
+        handler, takes_arg, needs_login, needs_write = entry
+        if needs_login and not self.logged_in:
+            self.reply(530, "Please login with USER and PASS.")
+            return True
+        if needs_write and not self.ensure_write_perm():
+            return True
+        result = handler(self, parts[1] if len(parts) > 1 else "") if takes_arg else handler(self)
+        # Only QUIT returns a value: False, to end the session
+        return result is not False
+
+    def close(self) -> None:
+        self._close_pasv_listener()
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class FTPServer:
+    """Accept control connections and run their commands on a thread pool.
+
+    Idle sessions hold no thread: their control sockets wait in a selector
+    (epoll on Linux), and a session is handed to one of max_workers
+    threads only when its socket becomes readable. The worker runs the
+    commands received, including any transfer they start, then gives the
+    socket back to the selector.
+    """
+
+    def __init__(self, config: FTPConfig, max_workers: int = MAX_WORKERS) -> None:
+        self.config = config
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix="ftp-session")
+        self._selector = selectors.DefaultSelector()
+        # Sessions to register again, filled by workers; the main loop is
+        # woken through the socket pair since it owns the selector
+        self._rearm: "queue.SimpleQueue[FTPSession]" = queue.SimpleQueue()
+        self._wake_r, self._wake_w = socket.socketpair()
+
+    def serve_forever(self) -> None:
+        config = self.config
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((config.host, config.port))
+        sock.listen(5)
+        log.info("FTP server listening on %s:%d, root=%s", config.host, config.port, config.root)
+
+        selector = self._selector
+        selector.register(sock, selectors.EVENT_READ)
+        selector.register(self._wake_r, selectors.EVENT_READ, self._wake_r)
         try:
             while True:
-                cmdline = self.read_command()
-                if cmdline is None:
-                    break
-                if not cmdline:
-                    continue
-                parts = cmdline.split(" ", 1)
-                command = parts[0].upper()
-                arg = parts[1] if len(parts) > 1 else ""
-
-                if command == "USER":
-                    self.handle_USER(arg)
-                elif command == "PASS":
-                    self.handle_PASS(arg)
-                elif command == "PWD":
-                    self.handle_PWD()
-                elif command == "CWD":
-                    self.handle_CWD(arg)
-                elif command == "TYPE":
-                    self.handle_TYPE(arg)
-                elif command == "PASV":
-                    self.handle_PASV()
-                elif command == "LIST":
-                    self.handle_LIST(arg)
-                elif command == "RETR":
-                    self.handle_RETR(arg)
-                elif command == "STOR":
-                    self.handle_STOR(arg)
-                elif command == "MKD":
-                    self.handle_MKD(arg)
-                elif command == "RMD":
-                    self.handle_RMD(arg)
-                elif command == "DELE":
-                    self.handle_DELE(arg)
-                elif command == "RNFR":
-                    self.handle_RNFR(arg)
-                elif command == "RNTO":
-                    self.handle_RNTO(arg)
-                elif command == "QUIT":
-                    self.reply(221, "Goodbye.")
-                    break
-                else:
-                    self.reply(502, "Command not implemented.")
+                for key, _events in selector.select():
+                    if key.fileobj is sock:
+                        self._accept(sock)
+                    elif key.data is self._wake_r:
+                        self._wake_r.recv(4096)
+                        while not self._rearm.empty():
+                            session = self._rearm.get()
+                            selector.register(session.conn, selectors.EVENT_READ, session)
+                    else:
+                        selector.unregister(key.fileobj)
+                        self._pool.submit(self._run, key.data)
         finally:
-            try:
-                self.control_file.close()
-            except Exception:
-                pass
-            try:
-                self.conn.close()
-            except Exception:
-                pass
+            sock.close()
+            self._pool.shutdown(wait=False)
+
+    def _accept(self, sock: socket.socket) -> None:
+        try:
+            conn, addr = sock.accept()
+        except OSError as e:
+            log.warning("[ACCEPT] failed: %s", e)
+            return
+        # Replies are small; send each one at once
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # recv() only runs once the socket is readable, so this bounds how
+        # long a reply may block a worker on a client that doesn't read
+        conn.settimeout(DATA_TIMEOUT)
+        log.info("New connection from %s", addr)
+        session = FTPSession(conn, addr, self.config)
+        try:
+            session.greet()
+        except OSError:
+            session.close()
+            return
+        self._selector.register(conn, selectors.EVENT_READ, session)
+
+    def _run(self, session: FTPSession) -> None:
+        """Worker: handle one readable event, then re-arm or close the session."""
+        try:
+            alive = session.handle_readable()
+        except (ConnectionError, TimeoutError) as e:
+            # Routine: the client reset the connection or stopped reading
+            log.info("[SESSION] %s dropped: %s", session.addr, e, exc_info=_trace())
+            alive = False
+        except Exception as e:
+            log.exception("[SESSION] error in session %s: %s", session.addr, e)
+            alive = False
+        if not alive:
+            session.close()
+            return
+        self._rearm.put(session)
+        self._wake_w.send(b"\0")
 
 
 def start_ftp_server(config: FTPConfig) -> None:
     """Start the FTP server and accept connections forever."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    sock.bind((config.host, config.port))
-    sock.listen(5)
-    print(f"FTP server listening on {config.host}:{config.port}, root={config.root}")
-
-    try:
-        while True:
-            conn, addr = sock.accept()
-            print(f"New connection from {addr}")
-            session = FTPSession(conn, addr, config)
-            threading.Thread(target=session.serve, daemon=True).start()
-    finally:
-        sock.close()
+    FTPServer(config).serve_forever()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     # You can adjust these settings for your experiments
     cfg = FTPConfig(
         host="0.0.0.0",         # or "127.0.0.1" for local only